@@ -1,60 +1,99 @@
 import numpy as np
+from src.utils.layer_raster import ROAD
+from src.city.zone_types import BUILDING_FOOTPRINTS, BUILDING_TYPES, BUILDING_STOREYS, RESIDENT_DENSITY
+from src.buildings.building_store import BuildingStore, type_code
 
-class Building:
-    def __init__(self, x, y, width, height, building_type):
-        self.x = x
-        self.y = y
-        self.width = width
-        self.height = height
-        self.type = building_type
+# Building type code placed in each zone
+ZONE_BUILDING_CODES = np.array([type_code(str(name)) for name in BUILDING_TYPES], dtype=np.uint8)
 
 class BuildingPlacer:
     def __init__(self, width, height):
         self.width = width
         self.height = height
-        self.buildings = []
-    
-    def place_building(self, x, y, building_width, building_height, building_type):
-        new_building = Building(x, y, building_width, building_height, building_type)
-        self.buildings.append(new_building)
+        self.buildings = BuildingStore()
+        # Cells covered by a building, so clearance checks cost O(footprint) however many buildings exist
+        self.occupied = np.zeros((height, width), dtype=bool)
+        self._building_map = None
+        self._building_map_version = -1
+
+    def place_building(self, x, y, building_width, building_height, building_type, storeys=1, population=0.0):
+        code = type_code(building_type) if isinstance(building_type, str) else building_type
+        self.buildings.append(x, y, building_width, building_height, code, storeys, population)
+        self.occupied[y:y+building_height, x:x+building_width] = True
         return True
 
     def is_area_clear(self, x, y, width, height, water_map):
-        if np.any(water_map[y:y+height, x:x+width]):
-            return False
-        for building in self.buildings:
-            if (x < building.x + building.width and x + width > building.x and
-                y < building.y + building.height and y + height > building.y):
-                return False
-        return True
+        area = np.s_[y:y+height, x:x+width]
+        return not (self.occupied[area].any() or water_map[area].any())
 
     def place_buildings_in_zones(self, zoning, road_network, heightmap, water_map):
-        for y in range(self.height):
-            for x in range(self.width):
-                if not road_network.has_road(x, y) and not water_map[y, x] and heightmap[y, x] < 0.7:
-                    zone = zoning.get_zone(x, y)
-                    if zone == 1:  # Residential
-                        if self.is_area_clear(x, y, 2, 2, water_map):
-                            self.place_building(x, y, 2, 2, "residential")
-                    elif zone == 2:  # Commercial
-                        if self.is_area_clear(x, y, 3, 3, water_map):
-                            self.place_building(x, y, 3, 3, "commercial")
-                    elif zone == 3:  # Industrial
-                        if self.is_area_clear(x, y, 4, 4, water_map):
-                            self.place_building(x, y, 4, 4, "industrial")
+        self._place_in_window(0, 0, self.width, self.height, zoning, road_network, heightmap, water_map)
+
+    def replace_buildings_in_region(self, x0, y0, x1, y1, zoning, road_network, heightmap, water_map):
+        """Re-place buildings for cells x0 <= x < x1, y0 <= y < y1 after a local edit.
+
+        Buildings overlapping the region are removed and the region, grown to
+        cover their footprints, is filled again from the current zoning.
+        Returns ``(removed, added)`` building counts.
+        """
+        removed = self.buildings.remove(self.buildings.overlapping(x0, y0, x1, y1))
+        if removed.size:
+            x0, y0 = min(x0, int(removed['x'].min())), min(y0, int(removed['y'].min()))
+            x1 = max(x1, int((removed['x'] + removed['width']).max()))
+            y1 = max(y1, int((removed['y'] + removed['height']).max()))
+        for building in removed:
+            self.occupied[building['y']:building['y']+building['height'],
+                          building['x']:building['x']+building['width']] = False
+        kept_count = len(self.buildings)
+        self._place_in_window(x0, y0, x1, y1, zoning, road_network, heightmap, water_map)
+        return removed.size, len(self.buildings) - kept_count
+
+    def _place_in_window(self, x0, y0, x1, y1, zoning, road_network, heightmap, water_map):
+        # Off-road, dry, low-lying cells, evaluated once for the whole window
+        window = np.s_[y0:y1, x0:x1]
+        buildable = ~road_network.layers.test(ROAD, window) & ~water_map[window] & (heightmap[window] < 0.7)
+        zones = zoning.zones[window]
+        footprints = np.where(buildable, BUILDING_FOOTPRINTS[zones], 0)
+        occupied = self.occupied
+        for y, x in np.argwhere(footprints > 0):
+            # Most candidates fall inside a building placed just before; skip them without a slice
+            if occupied[y0 + y, x0 + x]:
+                continue
+            size = int(footprints[y, x])
+            if self.is_area_clear(x0 + x, y0 + y, size, size, water_map):
+                zone = zones[y, x]
+                storeys = BUILDING_STOREYS[zone]
+                self.place_building(x0 + x, y0 + y, size, size, ZONE_BUILDING_CODES[zone], storeys,
+                                    RESIDENT_DENSITY[zone] * size * size * storeys)
 
     def get_building_map(self):
-        building_map = np.zeros((self.height, self.width), dtype=int)
-        for building in self.buildings:
-            building_map[building.y:building.y+building.height, 
-                         building.x:building.x+building.width] = self.get_building_type_id(building.type)
-        return building_map
+        """Read-only uint8 raster of building type codes, rebuilt only when the buildings change."""
+        if self._building_map_version != self.buildings.version:
+            self._building_map = self._rasterize()
+            self._building_map.flags.writeable = False
+            self._building_map_version = self.buildings.version
+        return self._building_map
+
+    def _rasterize(self):
+        building_map = np.zeros(self.height * self.width, dtype=np.uint8)
+        records = self.buildings.records
+        # One scatter per footprint shape; buildings never overlap, so the write order does not matter
+        shapes, groups = np.unique(records['width'].astype(np.int64) << 16 | records['height'], return_inverse=True)
+        for group, shape in enumerate(shapes):
+            rows = records[groups == group]
+            ys = rows['y'][:, np.newaxis, np.newaxis] + np.arange(shape & 0xFFFF)[:, np.newaxis]
+            xs = rows['x'][:, np.newaxis, np.newaxis] + np.arange(shape >> 16)
+            inside = (ys < self.height) & (xs < self.width)
+            codes = np.broadcast_to(rows['type'][:, np.newaxis, np.newaxis], inside.shape)
+            building_map[(ys * self.width + xs)[inside]] = codes[inside]
+        return building_map.reshape(self.height, self.width)
 
     @staticmethod
     def get_building_type_id(building_type):
-        return {"residential": 1, "commercial": 2, "industrial": 3}.get(building_type, 0)
+        return type_code(building_type)
 
 if __name__ == "__main__":
+    import time
     from src.terrain.heightmap_generator import generate_heightmap
     from src.terrain.water_generator import WaterGenerator
     from src.city.zoning import Zoning
@@ -64,13 +103,33 @@ if __name__ == "__main__":
     heightmap = generate_heightmap(width, height)
     water_gen = WaterGenerator(width, height)
     heightmap, water_map = water_gen.apply_water_features(heightmap)
-    
-    zoning = Zoning(width, height)
-    zoning.generate_random_zoning(water_map)
-    
+
     network = RoadNetwork(width, height)
     network.generate_organic_network(heightmap, water_map)
 
+    zoning = Zoning(width, height)
+    zoning.generate_sophisticated_zoning(water_map, network)
+
     placer = BuildingPlacer(width, height)
     placer.place_buildings_in_zones(zoning, network, heightmap, water_map)
-    print(f"Buildings placed. Total buildings: {len(placer.buildings)}")
\ No newline at end of file
+    print(f"Buildings placed. Total buildings: {len(placer.buildings)}")
+
+    # Placement time per cell should stay flat as the map (and building count) grows
+    for size in (256, 512, 1024):
+        rng = np.random.default_rng(0)
+        zoning = Zoning(size, size)
+        zoning.zones = np.kron(rng.integers(1, 7, (size // 16, size // 16)), np.ones((16, 16), dtype=np.uint8))
+        start = time.perf_counter()
+        placer = BuildingPlacer(size, size)
+        placer.place_buildings_in_zones(zoning, RoadNetwork(size, size), np.zeros((size, size)),
+                                        np.zeros((size, size), dtype=bool))
+        elapsed = time.perf_counter() - start
+        print(f"{size}x{size}: {len(placer.buildings)} buildings in {elapsed:.3f}s "
+              f"({elapsed / size**2 * 1e9:.0f} ns/cell)")
+
+    start = time.perf_counter()
+    placer.get_building_map()
+    first = time.perf_counter() - start
+    start = time.perf_counter()
+    placer.get_building_map()
+    print(f"Building map: {first * 1000:.1f}ms to rasterize, {(time.perf_counter() - start) * 1e6:.1f}us cached")
@@ -0,0 +1,155 @@
+import numpy as np
+from src.city.zone_types import ZONE_COUNT
+
+# Building type codes, as stored in the store and in the building raster
+NONE = 0
+RESIDENTIAL = 1
+COMMERCIAL = 2
+INDUSTRIAL = 3
+
+BUILDING_TYPE_NAMES = ['none', 'residential', 'commercial', 'industrial']
+
+def type_code(name):
+    return BUILDING_TYPE_NAMES.index(name) if name in BUILDING_TYPE_NAMES else NONE
+
+BUILDING_DTYPE = np.dtype([
+    ('x', np.int32), ('y', np.int32),
+    ('width', np.uint16), ('height', np.uint16),  # footprint, in cells
+    ('type', np.uint8), ('storeys', np.uint8),
+    ('population', np.float32),
+])
+
+class Building:
+    """Per-building view of one row of a ``BuildingStore``; valid until the store is compacted."""
+    __slots__ = ('store', 'index')
+
+    def __init__(self, store, index):
+        self.store = store
+        self.index = index
+
+    def _field(self, name):
+        return self.store.records[name][self.index].item()
+
+    x = property(lambda self: self._field('x'))
+    y = property(lambda self: self._field('y'))
+    width = property(lambda self: self._field('width'))
+    height = property(lambda self: self._field('height'))
+    type_code = property(lambda self: self._field('type'))
+    storeys = property(lambda self: self._field('storeys'))
+    population = property(lambda self: self._field('population'))
+
+    @property
+    def type(self):
+        return BUILDING_TYPE_NAMES[self.type_code]
+
+class BuildingStore:
+    """Buildings as rows of one structured array, grown by doubling.
+
+    ``records`` is a view of the live rows, so aggregates are single NumPy
+    operations on its columns. ``version`` increases on every change, for
+    callers caching anything derived from the buildings.
+    """
+
+    def __init__(self, capacity=1024):
+        self._data = np.zeros(capacity, dtype=BUILDING_DTYPE)
+        self.count = 0
+        self.version = 0
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, index):
+        if not -self.count <= index < self.count:
+            raise IndexError("building index out of range")
+        return Building(self, index % self.count)
+
+    def __iter__(self):
+        return (Building(self, index) for index in range(self.count))
+
+    @property
+    def records(self):
+        return self._data[:self.count]
+
+    def _reserve(self, count):
+        if count > self._data.size:
+            grown = np.zeros(max(count, 2 * self._data.size), dtype=BUILDING_DTYPE)
+            grown[:self.count] = self.records
+            self._data = grown
+
+    def append(self, x, y, width, height, building_type, storeys=1, population=0.0):
+        """Add one building; ``building_type`` is a type code. Returns its index."""
+        self._reserve(self.count + 1)
+        self._data[self.count] = (x, y, width, height, building_type, storeys, population)
+        self.count += 1
+        self.version += 1
+        return self.count - 1
+
+    def extend(self, x, y, width, height, building_type, storeys=1, population=0.0):
+        """Add many buildings at once from broadcastable column arrays."""
+        columns = np.broadcast_arrays(x, y, width, height, building_type, storeys, population)
+        added = columns[0].size
+        self._reserve(self.count + added)
+        rows = self._data[self.count:self.count + added]
+        for name, column in zip(BUILDING_DTYPE.names, columns):
+            rows[name] = column.ravel()
+        self.count += added
+        self.version += 1
+
+    def remove(self, mask):
+        """Drop the buildings where ``mask`` is true, keeping the order of the rest; returns the removed rows."""
+        removed = self.records[mask].copy()
+        kept = self.records[~mask]
+        self._data[:kept.size] = kept
+        self.count = kept.size
+        self.version += 1
+        return removed
+
+    def overlapping(self, x0, y0, x1, y1):
+        """True for buildings whose footprint reaches into cells x0 <= x < x1, y0 <= y < y1."""
+        r = self.records
+        return (r['x'] < x1) & (r['x'] + r['width'] > x0) & (r['y'] < y1) & (r['y'] + r['height'] > y0)
+
+    def of_type(self, building_type):
+        """Rows of the given type code."""
+        return self.records[self.records['type'] == building_type]
+
+    def footprint_areas(self):
+        return self.records['width'].astype(np.int64) * self.records['height']
+
+    def total_footprint_area(self, building_type=None):
+        areas = self.footprint_areas()
+        if building_type is not None:
+            areas = areas[self.records['type'] == building_type]
+        return int(areas.sum())
+
+    def count_per_type(self):
+        return np.bincount(self.records['type'], minlength=len(BUILDING_TYPE_NAMES))
+
+    def count_per_zone(self, zones):
+        """Buildings per zone id of the cell at their top-left corner."""
+        return np.bincount(zones[self.records['y'], self.records['x']], minlength=ZONE_COUNT)
+
+    def population_per_zone(self, zones):
+        return np.bincount(zones[self.records['y'], self.records['x']], weights=self.records['population'],
+                           minlength=ZONE_COUNT)
+
+if __name__ == "__main__":
+    import time
+    import tracemalloc
+
+    count = 1_000_000
+    rng = np.random.default_rng(0)
+    store = BuildingStore()
+    tracemalloc.start()
+    start = time.perf_counter()
+    for _ in range(10):
+        n = count // 10
+        store.extend(rng.integers(0, 4096, n), rng.integers(0, 4096, n), 2, 2, rng.integers(1, 4, n), 2, 8.0)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    print(f"{len(store)} buildings in {elapsed:.3f}s, {store.records.nbytes / count:.0f} bytes each "
+          f"(peak {peak / 2**20:.0f} MiB)")
+    start = time.perf_counter()
+    per_type = store.count_per_type()
+    area = store.total_footprint_area(RESIDENTIAL)
+    print(f"Per type {per_type.tolist()}, residential footprint {area} cells in {time.perf_counter() - start:.3f}s")
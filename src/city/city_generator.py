@@ -1,45 +1,73 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
 import numpy as np
 from src.terrain.heightmap_generator import generate_heightmap
 from src.terrain.water_generator import WaterGenerator
 from src.city.city_limits import CityLimits
 from src.city.zoning import Zoning
 from src.roads.road_network import RoadNetwork
+from src.roads.traffic import TrafficAssignment, trip_demand
 from src.buildings.building_placement import BuildingPlacer
 from src.city.parks_and_landmarks import ParksAndLandmarks
+from src.city.raster_store import RasterStore
+from src.utils.rng import spawn_rngs, derive_seed
+from src.utils.layer_raster import LayerRaster, ROAD, MAIN_ROAD, PARK, LANDMARK
 
 class CityGenerator:
-    def __init__(self, width, height):
+    def __init__(self, width, height, store_dir=None, seed=None):
         self.width = width
         self.height = height
+        # Each stage draws from its own child stream, so a seed reproduces the whole city
+        self.seed = seed
+        # Optional disk-backed layers for maps that do not fit in memory
+        self.store = RasterStore(width, height, store_dir) if store_dir else None
+        # Water, road, park and landmark flags shared by every stage
+        self.layers = LayerRaster(width, height, bits=self.store.allocate('layers') if self.store is not None else None)
         self.heightmap = None
         self.water_map = None
+        # Kept so later stages can reuse its flow and lake rasters
+        self.water_generator = None
         self.city_limits = None
         self.zoning = None
         self.road_network = None
         self.building_placer = None
         self.parks_and_landmarks = None
+        self.traffic = None
+        self.congestion = None
+        # Building raster last written to the store, to skip rewriting it when nothing changed
+        self._stored_buildings = None
+        # Layer raster version last written out as boolean views
+        self._stored_layers_version = None
 
     def generate_city(self):
+        terrain_rng, water_rng, road_rng, parks_rng = spawn_rngs(self.seed, 4)
+
         # Generate terrain
-        self.heightmap = generate_heightmap(self.width, self.height)
+        self.heightmap = generate_heightmap(self.width, self.height, seed=derive_seed(terrain_rng))
 
         # Generate water features
-        water_gen = WaterGenerator(self.width, self.height)
-        self.heightmap, self.water_map = water_gen.apply_water_features(self.heightmap)
+        self.water_generator = WaterGenerator(self.width, self.height, rng=water_rng, layers=self.layers)
+        self.heightmap, self.water_map = self.water_generator.apply_water_features(self.heightmap)
+        self.heightmap = self._spill('heightmap', self.heightmap)
+        self.water_map = self._spill('water_map', self.water_map)
 
         # Create city limits
         self.city_limits = CityLimits(self.width, self.height)
 
         # Create road network
-        self.road_network = RoadNetwork(self.width, self.height)
+        self.road_network = RoadNetwork(self.width, self.height, rng=road_rng, layers=self.layers)
         self.road_network.generate_organic_network(self.heightmap, self.water_map)
 
         # Create zoning
         self.zoning = Zoning(self.width, self.height)
         self.zoning.generate_sophisticated_zoning(self.water_map, self.road_network)
+        self.zoning.zones = self._spill('zoning', self.zoning.zones)
+        # Road edits must keep distances exact as far as any zoning rule looks
+        self.road_network.edit_radius = self.zoning.road_reach()
 
         # Generate parks and landmarks
-        self.parks_and_landmarks = ParksAndLandmarks(self.width, self.height)
+        self.parks_and_landmarks = ParksAndLandmarks(self.width, self.height, rng=parks_rng, layers=self.layers)
         self.parks_and_landmarks.generate_parks(self.zoning, self.water_map, self.road_network)
         self.parks_and_landmarks.generate_landmarks(self.zoning, self.water_map, self.road_network)
 
@@ -47,8 +75,60 @@ class CityGenerator:
         self.building_placer = BuildingPlacer(self.width, self.height)
         self.building_placer.place_buildings_in_zones(self.zoning, self.road_network, self.heightmap, self.water_map)
 
+    def simulate_traffic(self, num_trips=100_000, iterations=10, capacity=200.0):
+        """Assign home-to-work trips from the zoning to the roads; returns the per-cell congestion raster."""
+        traffic_rng = spawn_rngs(self.seed, 5)[4]
+        origins, destinations = trip_demand(self.zoning.zones, num_trips, rng=traffic_rng)
+        self.traffic = TrafficAssignment.from_network(self.road_network, capacity)
+        self.traffic.assign(origins, destinations, iterations=iterations)
+        self.congestion = self._spill('congestion', self.traffic.congestion_raster(self.road_network.roads))
+        return self.congestion
+
+    def apply_road_edits(self, margin=None):
+        """Bring zoning and buildings up to date with the roads edited since the last call.
+
+        Only the bounding box of the edits, grown by ``margin`` cells, is
+        regenerated. The default is the zoning's road reach, the farthest a
+        road edit can change zoning, so no seams are left.
+        Returns the updated ``(x0, y0, x1, y1)`` region, or None if nothing changed.
+        """
+        region = self.road_network.pop_edit_region()
+        if region is None:
+            return None
+        margin = self.zoning.road_reach() if margin is None else margin
+        x0, y0 = max(0, region[0] - margin), max(0, region[1] - margin)
+        x1, y1 = min(self.width, region[2] + margin), min(self.height, region[3] + margin)
+        self.zoning.regenerate_region(x0, y0, x1, y1, self.water_map, self.road_network)
+        self.parks_and_landmarks.stamp_zones(self.zoning, x0, y0, x1, y1)
+        self.building_placer.replace_buildings_in_region(x0, y0, x1, y1, self.zoning, self.road_network,
+                                                         self.heightmap, self.water_map)
+        return x0, y0, x1, y1
+
+    def _spill(self, name, layer):
+        # Move a finished layer into the raster store so the in-memory copy can be freed
+        if self.store is None:
+            return layer
+        return self.store.store(name, layer)
+
     def get_city_data(self):
-        return {
+        if self.store is not None:
+            buildings = self.building_placer.get_building_map()
+            if buildings is not self._stored_buildings:
+                self.store['buildings'] = buildings
+                self._stored_buildings = buildings
+            # Boolean views of the shared layers for older consumers, rewritten in row blocks
+            # and only after the layers changed
+            if self.layers.version != self._stored_layers_version:
+                for name, flag in (('roads', ROAD), ('main_roads', MAIN_ROAD), ('parks', PARK), ('landmarks', LANDMARK)):
+                    layer = self.store.get(name)
+                    if layer is None:
+                        layer = self.store.allocate(name)
+                    for rows in self.store.row_blocks():
+                        layer[rows] = self.layers.test(flag, rows)
+                self._stored_layers_version = self.layers.version
+            self.store.flush()
+            return self.store
+        city_data = {
             'heightmap': self.heightmap,
             'water_map': self.water_map,
             'zoning': self.zoning.zones,
@@ -56,10 +136,32 @@ class CityGenerator:
             'main_roads': self.road_network.main_roads,
             'buildings': self.building_placer.get_building_map(),
             'parks': self.parks_and_landmarks.parks,
-            'landmarks': self.parks_and_landmarks.landmarks
+            'landmarks': self.parks_and_landmarks.landmarks,
+            'layers': self.layers.bits
         }
+        if self.congestion is not None:
+            city_data['congestion'] = self.congestion
+        return city_data
+
+def _generate_city_data(args):
+    width, height, seed = args
+    generator = CityGenerator(width, height, seed=seed)
+    generator.generate_city()
+    return generator.get_city_data()
+
+def generate_cities(width, height, seeds, workers=None):
+    """Generate one city per seed in a process pool; results match serial generation exactly."""
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count() or 1) as executor:
+        return list(executor.map(_generate_city_data, [(width, height, seed) for seed in seeds]))
 
 if __name__ == "__main__":
-    generator = CityGenerator(256, 256)
+    generator = CityGenerator(256, 256, seed=42)
     generator.generate_city()
-    print("City generated successfully!")
\ No newline at end of file
+    print("City generated successfully!")
+
+    import time
+    generator.road_network.add_road_line(40, 60, 70, 75)
+    generator.road_network.remove_road_line(120, 100, 120, 120)
+    start = time.perf_counter()
+    region = generator.apply_road_edits()
+    print(f"Road edits applied to region {region} in {time.perf_counter() - start:.3f}s")
\ No newline at end of file
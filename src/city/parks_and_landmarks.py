@@ -1,50 +1,99 @@
 import numpy as np
+from src.utils.rng import make_rng
+from src.utils.layer_raster import LayerRaster, PARK, LANDMARK
+from src.city import zone_types
+from src.city.placement import PlacementGrid, window_counts
+from src.utils.poisson_disk import poisson_disk_sample
 
 class ParksAndLandmarks:
-    def __init__(self, width, height):
+    def __init__(self, width, height, rng=None, layers=None):
         self.width = width
         self.height = height
-        self.parks = np.zeros((height, width), dtype=bool)
-        self.landmarks = np.zeros((height, width), dtype=bool)
+        self.rng = make_rng(rng)
+        self.layers = layers if layers is not None else LayerRaster(width, height)
+
+    @property
+    def parks(self):
+        return self.layers.test(PARK)
+
+    @parks.setter
+    def parks(self, mask):
+        self.layers.assign(PARK, mask)
+
+    @property
+    def landmarks(self):
+        return self.layers.test(LANDMARK)
+
+    @landmarks.setter
+    def landmarks(self, mask):
+        self.layers.assign(LANDMARK, mask)
+
+    def placement_grid(self, zoning, water_map, road_network):
+        """Free space for parks and landmarks: developable, dry and off the network's roads."""
+        blocked = ~zone_types.DEVELOPABLE[zoning.zones] | water_map | road_network.roads
+        return PlacementGrid(blocked, rng=self.rng)
 
     def generate_parks(self, zoning, water_map, road_network, num_parks=5, min_size=10, max_size=30):
-        for _ in range(num_parks):
-            size = np.random.randint(min_size, max_size)
-            attempts = 0
-            while attempts < 100:
-                x = np.random.randint(0, self.width - size)
-                y = np.random.randint(0, self.height - size)
-                if self.can_place_park(x, y, size, zoning, water_map, road_network):
-                    self.parks[y:y+size, x:x+size] = True
-                    zoning.zones[y:y+size, x:x+size] = 0  # Set park area to no zoning
-                    break
-                attempts += 1
+        """Place up to ``num_parks`` square parks on free land; returns how many fit."""
+        grid = self.placement_grid(zoning, water_map, road_network)
+        placed = 0
+        # Largest first, so each park size is placed in one run while the grid has its positions cached
+        for size in sorted(self.rng.integers(min_size, max_size, num_parks).tolist(), reverse=True):
+            spot = grid.place(size, size)
+            if spot is not None:
+                x, y = spot
+                self.layers.set(PARK, np.s_[y:y+size, x:x+size])
+                zoning.set_region(x, y, x+size, y+size, zone_types.PARK)
+                placed += 1
+        return placed
+
+    def stamp_zones(self, zoning, x0=0, y0=0, x1=None, y1=None):
+        """Write the park and landmark zoning back over a region, e.g. after it was regenerated."""
+        x1 = self.width if x1 is None else x1
+        y1 = self.height if y1 is None else y1
+        window = np.s_[y0:y1, x0:x1]
+        zones = zoning.zones[window]
+        zones[self.layers.test(PARK, window)] = zone_types.PARK
+        zones[self.layers.test(LANDMARK, window)] = zone_types.LANDMARK
+        zoning.refresh_region(x0, y0, x1, y1)
 
     def can_place_park(self, x, y, size, zoning, water_map, road_network):
         area = zoning.zones[y:y+size, x:x+size]
         return (not np.any(water_map[y:y+size, x:x+size]) and
-                not np.any(road_network.roads[y:y+size, x:x+size]) and
-                np.all(area > 0))  # Ensure we're not placing on water or existing parks
+                road_network.proximity.road_count(x, y, x+size, y+size) == 0 and
+                np.all(zone_types.DEVELOPABLE[area]))  # Not on water, roads or existing parks/landmarks
+
+    def generate_landmarks(self, zoning, water_map, road_network, num_landmarks=3, size=5, spacing=None):
+        """Place up to ``num_landmarks`` landmarks on free land within two cells of a road; returns how many fit.
 
-    def generate_landmarks(self, zoning, water_map, road_network, num_landmarks=3, size=5):
-        for _ in range(num_landmarks):
-            attempts = 0
-            while attempts < 100:
-                x = np.random.randint(0, self.width - size)
-                y = np.random.randint(0, self.height - size)
-                if self.can_place_landmark(x, y, size, zoning, water_map, road_network):
-                    self.landmarks[y:y+size, x:x+size] = True
-                    zoning.zones[y:y+size, x:x+size] = 4  # Set landmark area to special zoning
-                    break
-                attempts += 1
+        Landmarks are at least ``spacing`` cells apart (default an eighth of the
+        smaller map side), drawn by Poisson-disk sampling over the valid spots.
+        """
+        spacing = max(size * np.sqrt(2), min(self.width, self.height) / 8) if spacing is None else spacing
+        grid = self.placement_grid(zoning, water_map, road_network)
+        near_road = window_counts(road_network.proximity.sat, size, size, margin=2) > 0
+        valid = grid.valid_positions(size, size, require=near_road)
+        if not valid.any():
+            return 0
+        spots = poisson_disk_sample(valid, spacing, rng=self.rng).astype(np.intp)
+        self.rng.shuffle(spots)
+        placed = 0
+        for x, y in spots:
+            if placed == num_landmarks:
+                break
+            if valid[y, x]:
+                grid.claim(x, y, size, size)
+                self.layers.set(LANDMARK, np.s_[y:y+size, x:x+size])
+                zoning.set_region(x, y, x+size, y+size, zone_types.LANDMARK)
+                placed += 1
+        return placed
 
     def can_place_landmark(self, x, y, size, zoning, water_map, road_network):
         area = zoning.zones[y:y+size, x:x+size]
         return (not np.any(water_map[y:y+size, x:x+size]) and
-                not np.any(road_network.roads[y:y+size, x:x+size]) and
-                np.all(area > 0) and  # Ensure we're not placing on water or existing parks/landmarks
-                np.any(road_network.roads[max(0,y-2):min(self.height,y+size+2), 
-                                          max(0,x-2):min(self.width,x+size+2)]))  # Ensure it's near a road
+                road_network.proximity.road_count(x, y, x+size, y+size) == 0 and
+                np.all(zone_types.DEVELOPABLE[area]) and  # Not on water, roads or existing parks/landmarks
+                road_network.proximity.road_count(x-2, y-2, x+size+2, y+size+2) > 0)  # Ensure it's near a road
 
 if __name__ == "__main__":
     from src.city.zoning import Zoning
@@ -57,9 +106,9 @@ if __name__ == "__main__":
     water_gen = WaterGenerator(width, height)
     
     # Generate some dummy data
-    zoning.generate_random_zoning(np.zeros((height, width), dtype=bool))
     road_network.generate_organic_network(np.random.rand(height, width), np.zeros((height, width), dtype=bool))
     _, water_map = water_gen.apply_water_features(np.random.rand(height, width))
+    zoning.generate_sophisticated_zoning(water_map, road_network)
     
     parks_and_landmarks = ParksAndLandmarks(width, height)
     parks_and_landmarks.generate_parks(zoning, water_map, road_network)
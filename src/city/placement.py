@@ -0,0 +1,109 @@
+from collections import OrderedDict
+
+import numpy as np
+from src.utils.math_utils import summed_area_table
+from src.utils.rng import make_rng
+
+def window_counts(table, width, height, margin=0):
+    """Set cells in the ``width`` x ``height`` window at every top-left position, grown by ``margin``.
+
+    ``table`` is a summed-area table of the map; windows are clipped at the
+    map edge. Returns shape ``(map_height - height + 1, map_width - width + 1)``.
+    """
+    map_height, map_width = table.shape[0] - 1, table.shape[1] - 1
+    if margin == 0:
+        return table[height:, width:] - table[:-height, width:] - table[height:, :-width] + table[:-height, :-width]
+    xs = np.arange(map_width - width + 1)
+    ys = np.arange(map_height - height + 1)
+    x0, x1 = np.clip(xs - margin, 0, map_width), np.clip(xs + width + margin, 0, map_width)
+    y0, y1 = np.clip(ys - margin, 0, map_height)[:, np.newaxis], np.clip(ys + height + margin, 0, map_height)[:, np.newaxis]
+    return table[y1, x1] - table[y0, x1] - table[y1, x0] + table[y0, x0]
+
+class PlacementGrid:
+    """Finds free spots for rectangular features on a blocking raster.
+
+    Valid top-left positions for each footprint are found in one pass over
+    a summed-area table of ``blocked``, then sampled uniformly. Placing a
+    feature only invalidates the positions overlapping it, so the cost of a
+    placement does not grow with how crowded the map is. Position masks are
+    kept for the ``max_footprints`` most recently used footprints.
+    """
+
+    def __init__(self, blocked, rng=None, max_draws=32, max_footprints=4):
+        self.height, self.width = blocked.shape
+        self.rng = make_rng(rng)
+        self.max_draws = max_draws
+        self.max_footprints = max_footprints
+        self.table = summed_area_table(blocked)
+        self.placed = []
+        # (width, height, id(require)) -> [valid positions, candidate flat indices or None, require]
+        self._positions = OrderedDict()
+
+    def valid_positions(self, width, height, require=None):
+        """Boolean mask of free top-left positions; ``require`` adds a position mask of the same shape."""
+        key = (width, height, id(require))
+        if key in self._positions:
+            self._positions.move_to_end(key)
+        else:
+            if width > self.width or height > self.height:
+                valid = np.zeros((0, 0), dtype=bool)
+            else:
+                valid = window_counts(self.table, width, height) == 0
+                if require is not None:
+                    valid &= require
+                for rectangle in self.placed:
+                    self._invalidate(valid, width, height, *rectangle)
+            self._positions[key] = [valid, None, require]
+            if len(self._positions) > self.max_footprints:
+                self._positions.popitem(last=False)
+        return self._positions[key][0]
+
+    def place(self, width, height, require=None):
+        """Claim a random free ``width`` x ``height`` spot; returns its ``(x, y)`` or None if none is left.
+
+        Positions are first drawn over the whole mask, which needs no extra
+        memory while free spots are common; only when those draws miss are the
+        free positions listed and drawn from instead.
+        """
+        valid = self.valid_positions(width, height, require)
+        entry = self._positions[(width, height, id(require))]
+        if valid.size == 0:
+            return None
+        for attempt in range(2):
+            candidates = entry[1]
+            if candidates is not None and candidates.size == 0:
+                return None
+            # Draws uniform over positions that were valid are uniform over those still valid
+            for _ in range(self.max_draws):
+                position = (self.rng.integers(valid.size) if candidates is None
+                            else candidates[self.rng.integers(candidates.size)])
+                if valid.flat[position]:
+                    y, x = divmod(int(position), valid.shape[1])
+                    self.claim(x, y, width, height)
+                    return x, y
+            entry[1] = np.flatnonzero(valid).astype(np.int32)
+        return None
+
+    def claim(self, x, y, width, height):
+        """Block a rectangle for every later placement."""
+        self.placed.append((x, y, width, height))
+        for (w, h, _), (valid, _, _) in self._positions.items():
+            self._invalidate(valid, w, h, x, y, width, height)
+
+    @staticmethod
+    def _invalidate(valid, width, height, x, y, claimed_width, claimed_height):
+        valid[max(0, y - height + 1):max(0, y + claimed_height), max(0, x - width + 1):max(0, x + claimed_width)] = False
+
+if __name__ == "__main__":
+    import time
+
+    size = 4096
+    blocked = np.random.default_rng(0).random((size, size)) < 0.001
+    start = time.perf_counter()
+    grid = PlacementGrid(blocked, rng=0)
+    sizes = np.sort(np.random.default_rng(1).integers(10, 30, 500))[::-1]
+    placed = sum(grid.place(s, s) is not None for s in sizes.tolist())
+    cached = sum(valid.nbytes + (0 if candidates is None else candidates.nbytes)
+                 for valid, candidates, _ in grid._positions.values())
+    print(f"{size}x{size}: placed {placed}/500 parks of {np.unique(sizes).size} sizes in "
+          f"{time.perf_counter() - start:.3f}s, {cached / 2**20:.0f} MiB of cached positions")
@@ -0,0 +1,106 @@
+import os
+import tempfile
+from collections.abc import MutableMapping
+
+import numpy as np
+
+class RasterStore(MutableMapping):
+    """Disk-backed city layers, usable wherever the ``get_city_data()`` dict is.
+
+    Every layer is an ``np.memmap`` over a ``.npy`` file in ``directory``, so
+    maps larger than RAM only keep the pages currently in use resident.
+    """
+
+    LAYER_DTYPES = {
+        'heightmap': np.float32,
+        'water_map': np.bool_,
+        'zoning': np.uint8,
+        'roads': np.bool_,
+        'main_roads': np.bool_,
+        'buildings': np.uint8,
+        'parks': np.bool_,
+        'landmarks': np.bool_,
+        'layers': np.uint8,
+        'congestion': np.float32,
+    }
+
+    def __init__(self, width, height, directory=None):
+        self.width = width
+        self.height = height
+        self.directory = directory or tempfile.mkdtemp(prefix='skyline_raster_')
+        os.makedirs(self.directory, exist_ok=True)
+        self.layers = {}
+
+    @classmethod
+    def open(cls, directory):
+        """Reopen the layers previously written to ``directory``."""
+        layers = {}
+        for filename in sorted(os.listdir(directory)):
+            name, ext = os.path.splitext(filename)
+            if ext == '.npy':
+                layers[name] = np.load(os.path.join(directory, filename), mmap_mode='r+')
+        if not layers:
+            raise ValueError(f"No raster layers found in {directory}")
+        height, width = next(iter(layers.values())).shape
+        store = cls(width, height, directory)
+        store.layers = layers
+        return store
+
+    def path(self, name):
+        return os.path.join(self.directory, f"{name}.npy")
+
+    def allocate(self, name, dtype=None):
+        """Create (or replace) a zero-filled layer and return its memmap."""
+        dtype = dtype or self.LAYER_DTYPES.get(name, np.float32)
+        self.layers.pop(name, None)
+        layer = np.lib.format.open_memmap(self.path(name), mode='w+', dtype=dtype, shape=(self.height, self.width))
+        self.layers[name] = layer
+        return layer
+
+    def store(self, name, array, dtype=None):
+        """Copy ``array`` into the layer ``name`` and return the backing memmap."""
+        array = np.asarray(array)
+        if array.shape != (self.height, self.width):
+            raise ValueError(f"Layer {name} has shape {array.shape}, expected {(self.height, self.width)}")
+        layer = self.allocate(name, dtype)
+        # Copy in row blocks so the dtype conversion never needs a full-size temporary
+        for rows in self.row_blocks():
+            layer[rows] = array[rows]
+        return layer
+
+    def row_blocks(self):
+        """Slices of whole rows covering the map, each about 16M cells."""
+        rows = max(1, (1 << 24) // max(1, self.width))
+        return [np.s_[y:y + rows] for y in range(0, self.height, rows)]
+
+    def flush(self):
+        for layer in self.layers.values():
+            layer.flush()
+
+    def __getitem__(self, name):
+        return self.layers[name]
+
+    def __setitem__(self, name, array):
+        if array is self.layers.get(name):
+            return
+        self.store(name, array)
+
+    def __delitem__(self, name):
+        self.layers.pop(name)
+        os.remove(self.path(name))
+
+    def __iter__(self):
+        return iter(self.layers)
+
+    def __len__(self):
+        return len(self.layers)
+
+if __name__ == "__main__":
+    store = RasterStore(512, 512)
+    store['heightmap'] = np.random.rand(512, 512)
+    store['water_map'] = np.random.rand(512, 512) < 0.1
+    store.flush()
+    reopened = RasterStore.open(store.directory)
+    print(f"Layers in {store.directory}: {list(reopened)}")
+    for name, layer in reopened.items():
+        print(f"{name}: {layer.dtype}, {layer.nbytes / 1024:.0f} KiB")
@@ -0,0 +1,38 @@
+import numpy as np
+
+# Zone ids, as stored in the uint8 zone raster
+NONE = 0  # water, roads and unzoned land
+LOW_RES = 1
+MED_RES = 2
+HIGH_RES = 3
+COMMERCIAL = 4
+INDUSTRIAL = 5
+MIXED_USE = 6
+PARK = 7
+LANDMARK = 8
+
+ZONE_DTYPE = np.uint8
+ZONE_NAMES = ['none', 'low_res', 'med_res', 'high_res', 'commercial', 'industrial', 'mixed_use', 'park', 'landmark']
+ZONE_COUNT = len(ZONE_NAMES)
+
+# Lookup tables indexed by zone id, e.g. BUILDING_FOOTPRINTS[zones] for a whole raster
+ZONE_COLORS = ['blue', 'green', 'yellowgreen', 'yellow', 'red', 'purple', 'orange', 'darkgreen', 'gold']
+BUILDING_TYPES = np.array(['', 'residential', 'residential', 'residential', 'commercial', 'industrial',
+                           'commercial', '', ''])
+# Side length of the square building placed in each zone, 0 where nothing is built
+BUILDING_FOOTPRINTS = np.array([0, 2, 2, 2, 3, 4, 3, 0, 0], dtype=np.uint8)
+# Storeys of the buildings placed in each zone
+BUILDING_STOREYS = np.array([0, 1, 2, 6, 3, 2, 4, 0, 0], dtype=np.uint8)
+# Relative residents and jobs per cell
+RESIDENT_DENSITY = np.array([0, 1, 2, 4, 0, 0, 1, 0, 0], dtype=np.float64)
+JOB_DENSITY = np.array([0, 0, 0, 0, 2, 1, 1, 0, 0], dtype=np.float64)
+# Land that is zoned for development and free for parks and landmarks
+DEVELOPABLE = np.array([False, True, True, True, True, True, True, False, False])
+
+def zone_id(name):
+    return ZONE_NAMES.index(name)
+
+if __name__ == "__main__":
+    zones = np.random.default_rng(0).integers(0, ZONE_COUNT, (4096, 4096)).astype(ZONE_DTYPE)
+    print(f"Zone raster: {zones.nbytes / 2**20:.0f} MiB as uint8 vs {zones.size * 8 / 2**20:.0f} MiB as int64")
+    print(f"Residents: {RESIDENT_DENSITY[zones].sum():.0f}, jobs: {JOB_DENSITY[zones].sum():.0f}")
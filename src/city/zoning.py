@@ -1,80 +1,228 @@
 import numpy as np
 from scipy.ndimage import distance_transform_edt
+from src.city.zone_types import ZONE_DTYPE, ZONE_COLORS, ZONE_COUNT, ZONE_NAMES
+from src.city.zoning_rules import ZoningRules, DEFAULT_RULES
 
 class Zoning:
-    def __init__(self, width, height):
+    def __init__(self, width, height, rules=DEFAULT_RULES, tile_size=64):
         self.width = width
         self.height = height
-        self.zones = np.zeros((height, width), dtype=int)
-        
+        self.rules = ZoningRules(rules)
+        self._water_cache = None
+        # Zone histogram per tile_size x tile_size tile, shape (tiles_y, tiles_x, ZONE_COUNT)
+        self.tile_size = tile_size
+        self.tile_counts = np.zeros((-(-height // tile_size), -(-width // tile_size), ZONE_COUNT), dtype=np.int32)
+        self.zones = np.zeros((height, width), dtype=ZONE_DTYPE)
+
+    @property
+    def zones(self):
+        return self._zones
+
+    @zones.setter
+    def zones(self, zones):
+        self._zones = zones
+        self.refresh_region(0, 0, self.width, self.height)
+
     def set_zone(self, x, y, zone_type):
         if 0 <= x < self.width and 0 <= y < self.height:
-            self.zones[y, x] = zone_type
-        
+            tile = self.tile_counts[y // self.tile_size, x // self.tile_size]
+            tile[self._zones[y, x]] -= 1
+            tile[zone_type] += 1
+            self._zones[y, x] = zone_type
+
+    def set_region(self, x0, y0, x1, y1, zone_type):
+        """Zone every cell x0 <= x < x1, y0 <= y < y1 as ``zone_type``."""
+        self._zones[y0:y1, x0:x1] = zone_type
+        self.refresh_region(x0, y0, x1, y1)
+
+    def refresh_region(self, x0, y0, x1, y1):
+        """Recount the tile histograms covering a region; call after writing to ``zones`` directly."""
+        tile = self.tile_size
+        tx0, ty0 = max(0, x0) // tile, max(0, y0) // tile
+        tx1, ty1 = -(-min(x1, self.width) // tile), -(-min(y1, self.height) // tile)
+        if tx1 <= tx0 or ty1 <= ty0:
+            return
+        block = self._zones[ty0 * tile:ty1 * tile, tx0 * tile:tx1 * tile]
+        rows = np.arange(block.shape[0], dtype=np.int32) // tile
+        cols = np.arange(block.shape[1], dtype=np.int32) // tile
+        tile_ids = rows[:, np.newaxis] * (tx1 - tx0) + cols
+        counts = np.bincount((tile_ids * ZONE_COUNT + block).ravel(), minlength=(ty1 - ty0) * (tx1 - tx0) * ZONE_COUNT)
+        self.tile_counts[ty0:ty1, tx0:tx1] = counts.reshape(ty1 - ty0, tx1 - tx0, ZONE_COUNT)
+
+    def zone_counts(self, x0=0, y0=0, x1=None, y1=None):
+        """Number of cells of each zone type in x0 <= x < x1, y0 <= y < y1, indexed by zone id.
+
+        Whole tiles are read from the tile index; only the cells of the
+        partially covered tiles along the border are counted directly.
+        """
+        x0, y0 = max(0, x0), max(0, y0)
+        x1 = self.width if x1 is None else min(x1, self.width)
+        y1 = self.height if y1 is None else min(y1, self.height)
+        counts = np.zeros(ZONE_COUNT, dtype=np.int64)
+        if x1 <= x0 or y1 <= y0:
+            return counts
+        tile = self.tile_size
+        # Whole tiles inside the region; the map edge closes a partial last tile
+        tx0, ty0 = -(-x0 // tile), -(-y0 // tile)
+        tx1 = self.tile_counts.shape[1] if x1 == self.width else x1 // tile
+        ty1 = self.tile_counts.shape[0] if y1 == self.height else y1 // tile
+        if tx1 <= tx0 or ty1 <= ty0:
+            return self._count_cells(counts, x0, y0, x1, y1)
+        counts += self.tile_counts[ty0:ty1, tx0:tx1].sum(axis=(0, 1))
+        ix0, iy0 = tx0 * tile, ty0 * tile
+        ix1, iy1 = min(tx1 * tile, self.width), min(ty1 * tile, self.height)
+        self._count_cells(counts, x0, y0, x1, iy0)
+        self._count_cells(counts, x0, iy1, x1, y1)
+        self._count_cells(counts, x0, iy0, ix0, iy1)
+        self._count_cells(counts, ix1, iy0, x1, iy1)
+        return counts
+
+    def _count_cells(self, counts, x0, y0, x1, y1):
+        if x1 > x0 and y1 > y0:
+            counts += np.bincount(self._zones[y0:y1, x0:x1].ravel(), minlength=ZONE_COUNT)
+        return counts
+
     def get_zone(self, x, y):
         if 0 <= x < self.width and 0 <= y < self.height:
             return self.zones[y, x]
         return None
 
-    def generate_sophisticated_zoning(self, water_map, road_network, city_center=None):
-        # Define zone types
-        WATER = 0
-        LOW_RES = 1
-        MED_RES = 2
-        HIGH_RES = 3
-        COMMERCIAL = 4
-        INDUSTRIAL = 5
-        MIXED_USE = 6
+    def generate_sophisticated_zoning(self, water_map, road_network, city_center=None, heightmap=None):
+        self._zones = self._zone_window(0, 0, self.width, self.height, water_map, road_network, city_center, heightmap)
 
-        # Initialize with low-density residential
-        self.zones = np.full((self.height, self.width), LOW_RES)
+        # Smooth transitions between zones
+        self.smooth_transitions()
+
+    def road_reach(self, iterations=2, radius=1):
+        """How far from an edited road zoning can change: the largest road distance the rules test plus the smoothing reach."""
+        return int(np.ceil(self.rules.max_threshold('road_distance'))) + iterations * radius
+
+    def regenerate_region(self, x0, y0, x1, y1, water_map, road_network, city_center=None, iterations=2, radius=1,
+                          heightmap=None):
+        """Recompute zoning for cells x0 <= x < x1, y0 <= y < y1 after local road edits.
 
-        # Set water areas
-        self.zones[water_map] = WATER
+        The zoning rules are applied to a margin of ``iterations * radius``
+        cells around the region before smoothing, so the written cells match
+        a full regeneration exactly and there is no seam at the region border.
+        """
+        margin = iterations * radius
+        cx0, cy0 = max(0, x0 - margin), max(0, y0 - margin)
+        cx1, cy1 = min(self.width, x1 + margin), min(self.height, y1 + margin)
+        context = self._zone_window(cx0, cy0, cx1, cy1, water_map, road_network, city_center, heightmap)
+        context = majority_filter(context, iterations, radius)
+        self._zones[y0:y1, x0:x1] = context[y0 - cy0:y1 - cy0, x0 - cx0:x1 - cx0]
+        self.refresh_region(x0, y0, x1, y1)
 
-        # Define city center if not provided
+    def _zone_window(self, x0, y0, x1, y1, water_map, road_network, city_center=None, heightmap=None):
+        window = np.s_[y0:y1, x0:x1]
         if city_center is None:
             city_center = (self.width // 2, self.height // 2)
+        if heightmap is None:
+            heightmap = road_network.heightmap
+        center_dist, max_dist = self._center_distance(x0, y0, x1, y1, city_center)
+        fields = {
+            'center_distance': center_dist,
+            'road_distance': lambda: road_network.proximity.distance[window],
+            'water_distance': lambda: self._water_distance(water_map)[window],
+            'height': lambda: heightmap[window],
+            'slope': lambda: _window_slope(heightmap, x0, y0, x1, y1),
+        }
+        return self.rules.evaluate(fields, (y1 - y0, x1 - x0), scales={'center_distance': max_dist})
 
-        # Calculate distance from city center
-        y, x = np.ogrid[:self.height, :self.width]
+    def _center_distance(self, x0, y0, x1, y1, city_center):
+        # Distance from the city center, and to the farthest cell, which is always a map corner
+        y, x = np.ogrid[y0:y1, x0:x1]
         center_dist = np.sqrt((x - city_center[0])**2 + (y - city_center[1])**2)
-        max_dist = np.max(center_dist)
+        corners_x = np.array([0, self.width - 1])[:, np.newaxis] - city_center[0]
+        corners_y = np.array([0, self.height - 1])[np.newaxis, :] - city_center[1]
+        return center_dist, np.max(np.sqrt(corners_x**2 + corners_y**2))
 
-        # Create mixed-use and high-density residential near the city center
-        center_mask = center_dist < max_dist * 0.1
-        self.zones[center_mask] = MIXED_USE
-        self.zones[(center_dist < max_dist * 0.2) & (self.zones == LOW_RES)] = HIGH_RES
+    def _water_distance(self, water_map):
+        # Whole-map distance transform, kept while the same water map is passed in
+        if self._water_cache is None or self._water_cache[0] is not water_map:
+            if np.any(water_map):
+                distance = distance_transform_edt(~water_map).astype(np.float32)
+            else:
+                distance = np.full(water_map.shape, np.inf, dtype=np.float32)
+            self._water_cache = (water_map, distance)
+        return self._water_cache[1]
 
-        # Create medium-density residential in a ring around the center
-        self.zones[(center_dist < max_dist * 0.4) & (self.zones == LOW_RES)] = MED_RES
+    def smooth_transitions(self, iterations=2, radius=1):
+        self.zones = majority_filter(self.zones, iterations, radius)
 
-        # Place commercial zones near roads and residential areas
-        road_dist = distance_transform_edt(~road_network.roads)
-        commercial_mask = (road_dist < 3) & (self.zones >= LOW_RES) & (self.zones <= HIGH_RES)
-        self.zones[commercial_mask] = COMMERCIAL
+def _window_slope(heightmap, x0, y0, x1, y1):
+    # Gradient magnitude over a window, taken from a one-cell margin so it matches the full-map gradient
+    if heightmap is None:
+        raise ValueError("slope and height rules need a heightmap")
+    height, width = heightmap.shape
+    px0, py0, px1, py1 = max(0, x0 - 1), max(0, y0 - 1), min(width, x1 + 1), min(height, y1 + 1)
+    padded = heightmap[py0:py1, px0:px1]
+    if min(padded.shape) < 2:
+        return np.zeros((y1 - y0, x1 - x0))
+    slope = np.hypot(*np.gradient(padded))
+    return slope[y0 - py0:y1 - py0, x0 - px0:x1 - px0]
 
-        # Place industrial zones on the outskirts
-        industrial_mask = (center_dist > max_dist * 0.7) & (self.zones == LOW_RES)
-        self.zones[industrial_mask] = INDUSTRIAL
+def majority_filter(zones, iterations=2, radius=1, skip=None):
+    """Replace each interior cell by the most common zone in its (2 * radius + 1)^2 neighbourhood.
 
-        # Ensure no zones are placed on roads
-        self.zones[road_network.roads] = WATER  # Using WATER as a placeholder for roads
+    Cells in ``skip`` are left alone but still count as neighbours; by
+    default that is every zero (water/road) cell of the current pass. Ties
+    go to the smallest zone id, as with ``argmax(bincount(...))``. Neighbour
+    counts are box sums of shifted one-hot planes, one zone at a time; each
+    count is packed with the inverted zone id into one key so a running
+    maximum picks the winner and breaks ties in a single pass.
+    """
+    height, width = zones.shape
+    size = 2 * radius + 1
+    if height < size or width < size:
+        return zones
+    for _ in range(iterations):
+        present = np.flatnonzero(np.bincount(zones.ravel()))
+        top = int(present[-1])
+        shift = max(top.bit_length(), 1)
+        key_type = np.uint16 if (size * size).bit_length() + shift <= 16 else np.uint32
+        best = np.zeros((height - 2 * radius, width - 2 * radius), dtype=key_type)
+        for zone in present:
+            key = _box_count(zones == zone, radius).astype(key_type)
+            key <<= key_type(shift)
+            key |= key_type(top - zone)
+            np.maximum(best, key, out=best)
+        best &= key_type((1 << shift) - 1)
+        best_zone = (top - best.astype(np.int64)).astype(zones.dtype)
+        interior = zones[radius:height - radius, radius:width - radius]
+        update = interior != 0 if skip is None else ~skip[radius:height - radius, radius:width - radius]
+        zones = zones.copy()
+        zones[radius:height - radius, radius:width - radius] = np.where(update, best_zone, interior)
+    return zones
 
-        # Smooth transitions between zones
-        self.smooth_transitions()
+def _box_count(mask, radius):
+    # Number of set cells in each interior cell's (2 * radius + 1)^2 box, rows then columns
+    height, width = mask.shape
+    size = 2 * radius + 1
+    dtype = np.uint8 if size * size < 256 else np.uint16
+    rows = mask[:height - size + 1].astype(dtype)
+    for offset in range(1, size):
+        rows += mask[offset:height - size + 1 + offset]
+    count = rows[:, :width - size + 1].copy()
+    for offset in range(1, size):
+        count += rows[:, offset:width - size + 1 + offset]
+    return count
 
-    def smooth_transitions(self, iterations=2):
-        for _ in range(iterations):
-            new_zones = self.zones.copy()
-            for y in range(1, self.height - 1):
-                for x in range(1, self.width - 1):
-                    if self.zones[y, x] != 0:  # Skip water/road areas
-                        neighborhood = self.zones[y-1:y+2, x-1:x+2].flatten()
-                        new_zones[y, x] = np.argmax(np.bincount(neighborhood))
-            self.zones = new_zones
+def _majority_filter_loop(zones, iterations=2):
+    # Per-cell reference implementation of majority_filter with radius 1
+    height, width = zones.shape
+    for _ in range(iterations):
+        new_zones = zones.copy()
+        for y in range(1, height - 1):
+            for x in range(1, width - 1):
+                if zones[y, x] != 0:  # Skip water/road areas
+                    neighborhood = zones[y-1:y+2, x-1:x+2].flatten()
+                    new_zones[y, x] = np.argmax(np.bincount(neighborhood))
+        zones = new_zones
+    return zones
 
 if __name__ == "__main__":
+    import time
     from src.roads.road_network import RoadNetwork
     from src.terrain.water_generator import WaterGenerator
     import matplotlib.pyplot as plt
@@ -92,13 +240,36 @@ if __name__ == "__main__":
 
     # Visualize the zoning
     plt.figure(figsize=(10, 10))
-    cmap = plt.cm.colors.ListedColormap(['blue', 'green', 'yellowgreen', 'yellow', 'red', 'purple', 'orange'])
-    plt.imshow(zoning.zones, cmap=cmap)
-    plt.colorbar(ticks=range(7), label='Zone Type')
+    cmap = plt.cm.colors.ListedColormap(ZONE_COLORS)
+    plt.imshow(zoning.zones, cmap=cmap, vmin=0, vmax=len(ZONE_COLORS) - 1)
+    plt.colorbar(ticks=range(len(ZONE_COLORS)), label='Zone Type')
     plt.title('Sophisticated Zoning')
     plt.show()
 
     print("Zoning distribution:")
-    unique, counts = np.unique(zoning.zones, return_counts=True)
-    for zone, count in zip(unique, counts):
-        print(f"Zone {zone}: {count} tiles")
\ No newline at end of file
+    for zone, count in enumerate(zoning.zone_counts()):
+        if count:
+            print(f"Zone {zone} ({ZONE_NAMES[zone]}): {count} tiles")
+
+    large = Zoning(4096, 4096)
+    large.zones = np.random.default_rng(0).integers(0, ZONE_COUNT, (4096, 4096)).astype(ZONE_DTYPE)
+    start = time.perf_counter()
+    for _ in range(100):
+        large.zone_counts(100, 200, 3000, 3900)
+    indexed_time = (time.perf_counter() - start) / 100
+    start = time.perf_counter()
+    direct = np.bincount(large.zones[200:3900, 100:3000].ravel(), minlength=ZONE_COUNT)
+    scan_time = time.perf_counter() - start
+    print(f"4096x4096 zone mix query: indexed {indexed_time * 1000:.2f}ms vs full scan {scan_time * 1000:.1f}ms, "
+          f"identical: {np.array_equal(direct, large.zone_counts(100, 200, 3000, 3900))}")
+
+    for size in (256, 512):
+        zones = np.random.default_rng(0).integers(0, 7, (size, size))
+        start = time.perf_counter()
+        reference = _majority_filter_loop(zones)
+        loop_time = time.perf_counter() - start
+        start = time.perf_counter()
+        smoothed = majority_filter(zones)
+        vector_time = time.perf_counter() - start
+        print(f"{size}x{size} majority filter: loop {loop_time:.3f}s, vectorized {vector_time:.4f}s, "
+              f"identical: {np.array_equal(reference, smoothed)}")
\ No newline at end of file
@@ -0,0 +1,218 @@
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+import numpy as np
+from src.city.zone_types import NONE, LOW_RES, MED_RES, HIGH_RES, COMMERCIAL, INDUSTRIAL, MIXED_USE, ZONE_DTYPE
+
+Range = Optional[Tuple[Optional[float], Optional[float]]]
+
+# Largest lookup table compiled ahead of time; bigger rule sets resolve only the interval combinations a map has
+MAX_TABLE_SIZE = 1 << 20
+# Fields with more thresholds than this are coded by binary search instead of one comparison per threshold
+SEARCH_THRESHOLDS = 8
+
+# Fields a rule can test, all evaluated per cell
+FIELDS = ('center_distance', 'road_distance', 'water_distance', 'height', 'slope')
+
+@dataclass(frozen=True)
+class ZoningRule:
+    """Assign ``zone`` to cells whose fields all fall inside the given ranges.
+
+    Ranges are ``(low, high)`` with exclusive bounds; either end may be None.
+    ``center_distance`` is a fraction of the distance from the city centre to
+    the farthest map corner, ``road_distance`` and ``water_distance`` are in
+    cells (0 on the road or water itself). Where several rules match, the
+    highest ``priority`` wins; a rule without ranges matches everywhere.
+    """
+    zone: int
+    priority: int = 0
+    center_distance: Range = None
+    road_distance: Range = None
+    water_distance: Range = None
+    height: Range = None
+    slope: Range = None
+
+    def conditions(self):
+        """The rule as a tuple of ``(field, op, value)`` comparisons."""
+        terms = []
+        for field in FIELDS:
+            bounds = getattr(self, field)
+            if bounds is None:
+                continue
+            low, high = bounds
+            if low is not None:
+                terms.append((field, '>', low))
+            if high is not None:
+                terms.append((field, '<', high))
+        return tuple(terms)
+
+DEFAULT_RULES = [
+    ZoningRule(NONE, priority=100, road_distance=(None, 1)),
+    ZoningRule(MIXED_USE, priority=90, center_distance=(None, 0.1)),
+    ZoningRule(NONE, priority=80, water_distance=(None, 1)),
+    ZoningRule(COMMERCIAL, priority=70, road_distance=(None, 3)),
+    ZoningRule(INDUSTRIAL, priority=60, center_distance=(0.7, None)),
+    ZoningRule(HIGH_RES, priority=50, center_distance=(None, 0.2)),
+    ZoningRule(MED_RES, priority=40, center_distance=(None, 0.4)),
+    ZoningRule(LOW_RES, priority=0),
+]
+
+class ZoningRules:
+    """A rule set compiled into a lookup table over the rules' own thresholds.
+
+    The thresholds of each field split its range into intervals (plus the
+    threshold values themselves, since bounds are exclusive). Which rule
+    wins is decided once per combination of intervals, ahead of time, so
+    evaluating a map costs two comparisons per distinct threshold (one binary
+    search for fields with many) and one table gather, however many rules
+    share those thresholds. Fields no rule tests are never computed.
+
+    When the combinations outnumber ``MAX_TABLE_SIZE``, each field instead
+    gets a table from interval to the bitset of rules it satisfies; a cell's
+    bitsets are AND-ed across fields and its lowest set bit, the matching
+    rule of highest priority, picks the zone.
+    """
+
+    def __init__(self, rules=DEFAULT_RULES, default=NONE):
+        # Stable sort keeps list order among rules of equal priority
+        self.rules = sorted(rules, key=lambda rule: -rule.priority)
+        self.default = default
+        # Rules behind an unconditional one can never match
+        for cut, rule in enumerate(self.rules):
+            if not rule.conditions():
+                self.default = rule.zone
+                self.rules = self.rules[:cut]
+                break
+        terms = {term for rule in self.rules for term in rule.conditions()}
+        self.fields = [field for field in FIELDS if any(term[0] == field for term in terms)]
+        self.thresholds = {field: np.unique([value for name, _, value in terms if name == field])
+                           for field in self.fields}
+        self.sizes = [2 * self.thresholds[field].size + 1 for field in self.fields]
+        self.table_size = int(np.prod(self.sizes, dtype=np.float64))
+        self.table = self.rule_bits = None
+        if self.table_size <= MAX_TABLE_SIZE:
+            self.table = self._compile()
+        else:
+            self.rule_bits = self._compile_bits()
+
+    def max_threshold(self, field):
+        """Largest threshold any rule sets on ``field``, 0 when none does."""
+        thresholds = self.thresholds.get(field)
+        return float(thresholds.max()) if thresholds is not None else 0.0
+
+    def _matches(self, rule, field, codes):
+        # Whether interval codes of ``field`` satisfy the rule's conditions on it. Code k of a field
+        # with sorted thresholds t: even k is the open interval (t[k/2 - 1], t[k/2]), odd k is
+        # the value t[(k - 1)/2] itself
+        mask = np.ones(codes.shape, dtype=bool)
+        for name, op, value in rule.conditions():
+            if name == field:
+                index = np.searchsorted(self.thresholds[field], value)
+                # Codes above 2 * index + 1 lie above threshold ``index``, codes up to 2 * index below it
+                mask &= codes > 2 * index + 1 if op == '>' else codes <= 2 * index
+        return mask
+
+    def _compile(self):
+        codes = np.indices(self.sizes).reshape(len(self.sizes), -1) if self.sizes else np.zeros((0, 1), dtype=np.intp)
+        masks = []
+        for rule in self.rules:
+            mask = np.ones(codes.shape[1], dtype=bool)
+            for field, field_codes in zip(self.fields, codes):
+                mask &= self._matches(rule, field, field_codes)
+            masks.append(mask)
+        zones = [rule.zone for rule in self.rules]
+        table = np.select(masks, zones, self.default) if masks else np.full(codes.shape[1], self.default)
+        return table.astype(ZONE_DTYPE)
+
+    def _compile_bits(self):
+        # Per field, a (codes, words) table of 64-rule bitsets in priority order
+        words = -(-len(self.rules) // 64)
+        rule_bits = {}
+        for field, size in zip(self.fields, self.sizes):
+            codes = np.arange(size)
+            bits = np.zeros((size, words), dtype=np.uint64)
+            for position, rule in enumerate(self.rules):
+                bits[self._matches(rule, field, codes), position // 64] |= np.uint64(1) << np.uint64(position % 64)
+            rule_bits[field] = bits
+        return rule_bits
+
+    def evaluate(self, fields, shape, scales=None):
+        """Zone raster of ``shape`` from ``fields``, a mapping of field name to array or zero-argument callable.
+
+        ``scales`` optionally multiplies a field's thresholds, so a field can be
+        passed in raw units while its rules are written as fractions.
+        """
+        scales = scales or {}
+        codes = {}
+        for field in self.fields:
+            value = fields[field]
+            value = np.broadcast_to(value() if callable(value) else value, shape)
+            codes[field] = self._interval_codes(value, self.thresholds[field] * scales.get(field, 1))
+        if self.table is not None:
+            index = np.zeros(shape, dtype=np.uint16 if self.table_size <= 1 << 16 else np.int64)
+            for field, size in zip(self.fields, self.sizes):
+                index *= size
+                index += codes[field].astype(index.dtype, copy=False)
+            return self.table[index]
+
+        zones = np.full(shape, self.default, dtype=ZONE_DTYPE)
+        undecided = np.ones(shape, dtype=bool)
+        zone_of = np.array([rule.zone for rule in self.rules], dtype=ZONE_DTYPE)
+        for word in range(-(-len(self.rules) // 64)):
+            bits = np.full(shape, np.iinfo(np.uint64).max, dtype=np.uint64)
+            for field in self.fields:
+                bits &= self.rule_bits[field][codes[field], word]
+            # Lowest set bit, isolated and converted exactly to its position through the float exponent
+            lowest = np.frexp((bits & (~bits + np.uint64(1))).astype(np.float64))[1] - 1
+            matched = undecided & (bits != 0)
+            zones[matched] = zone_of[np.minimum(64 * word + lowest[matched], zone_of.size - 1)]
+            undecided &= ~matched
+        return zones
+
+    @staticmethod
+    def _interval_codes(value, thresholds):
+        # Thresholds below each value plus thresholds at or below it
+        if thresholds.size > SEARCH_THRESHOLDS:
+            # t < v exactly when the next float after t is <= v, so one search over both counts them
+            edges = np.column_stack([thresholds, np.nextafter(thresholds, np.inf)]).ravel()
+            return np.searchsorted(edges, value, 'right').astype(np.uint16)
+        codes = np.zeros(value.shape, dtype=np.uint8)
+        for threshold in thresholds:
+            codes += value > threshold
+            codes += value >= threshold
+        return codes
+
+if __name__ == "__main__":
+    import time
+
+    size = 2048
+    y, x = np.ogrid[:size, :size]
+    rng = np.random.default_rng(0)
+    fields = {
+        'center_distance': np.hypot(x - size / 2, y - size / 2) / np.hypot(size / 2, size / 2),
+        'road_distance': rng.random((size, size)).astype(np.float32) * 20,
+        'water_distance': rng.random((size, size)).astype(np.float32) * 50,
+        'height': rng.random((size, size)).astype(np.float32),
+        'slope': rng.random((size, size)).astype(np.float32) * 0.1,
+    }
+    many_rules = DEFAULT_RULES + [
+        ZoningRule(int(rng.integers(1, 7)), priority=int(rng.integers(1, 100)),
+                   center_distance=(rng.integers(0, 5) / 10, rng.integers(5, 11) / 10),
+                   road_distance=(None, float(rng.integers(2, 10))),
+                   slope=(None, 0.05), height=(0.1, None))
+        for _ in range(32)]
+    # Thresholds on every field: far more interval combinations than a table can hold
+    five_field_rules = DEFAULT_RULES + [
+        ZoningRule(int(rng.integers(1, 7)), priority=int(rng.integers(1, 100)),
+                   center_distance=(rng.integers(0, 5) / 10, rng.integers(5, 11) / 10),
+                   road_distance=(None, float(rng.integers(2, 20))),
+                   water_distance=(float(rng.integers(0, 50)), None),
+                   slope=(None, float(rng.random() * 0.1)), height=(float(rng.random()), None))
+        for _ in range(24)]
+    for name, rules in (("default", DEFAULT_RULES), ("40 rules", many_rules), ("32 rules, 5 fields", five_field_rules)):
+        compiled = ZoningRules(rules)
+        start = time.perf_counter()
+        zones = compiled.evaluate(fields, (size, size))
+        table = f"{compiled.table_size}-entry table" if compiled.table is not None else \
+            f"{compiled.table_size:.1e} combinations, rule bitsets"
+        print(f"{size}x{size}, {name}: {len(compiled.rules)} rules, {table}, {time.perf_counter() - start:.3f}s")
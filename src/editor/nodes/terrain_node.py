@@ -4,19 +4,25 @@ from typing import Dict, Any
 import numpy as np
 
 from src.editor.node import Node
-from src.utils.math_utils import perlin
+from src.terrain.heightmap_generator import generate_heightmap
+from src.terrain.octave_cache import OctaveCache, DEFAULT_MAX_BYTES, octave_set_bytes
 
 @dataclass
 class TerrainConfig:
     width: int = 256
     height: int = 256
     scale: float = 50.0
+    octaves: int = 6
+    persistence: float = 0.5
+    lacunarity: float = 2.0
     seed: int = 0
 
 class TerrainNode(Node):
     def __init__(self, title: str):
         super().__init__(title, inputs=[], outputs=['heightmap'])
         self.config = TerrainConfig()
+        # Raw octave layers survive config edits, so re-weighting is cheap
+        self.octave_cache = OctaveCache()
 
     def get_config_options(self) -> Dict[str, Any]:
         return asdict(self.config)
@@ -34,12 +40,15 @@ class TerrainNode(Node):
             raise ValueError("Width and height must be positive integers")
         if self.config.scale <= 0:
             raise ValueError("Scale must be a positive number")
-
-        x = np.arange(self.config.width) / self.config.scale
-        y = np.arange(self.config.height) / self.config.scale
-        xx, yy = np.meshgrid(x, y)
-        
-        heightmap = perlin(xx, yy, self.config.seed)
+        if self.config.octaves <= 0:
+            raise ValueError("Octaves must be a positive integer")
+
+        # Room for every octave of the configured map, so edits never recompute a layer
+        self.octave_cache.max_bytes = max(DEFAULT_MAX_BYTES, octave_set_bytes(self.config.width, self.config.height,
+                                                                              self.config.octaves))
+        heightmap = generate_heightmap(self.config.width, self.config.height, self.config.scale,
+                                       self.config.octaves, self.config.persistence, self.config.lacunarity,
+                                       self.config.seed, cache=self.octave_cache)
         self.output_data['heightmap'] = heightmap
 
 def main() -> None:
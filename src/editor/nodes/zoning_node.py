@@ -1,5 +1,6 @@
 from src.editor.node import Node
 from src.city.zoning import Zoning
+from src.city.zone_types import ZONE_NAMES
 
 class ZoningNode(Node):
     def __init__(self):
@@ -11,7 +12,6 @@ class ZoningNode(Node):
         return {"zoning_map": self.zoning.zones}
 
 if __name__ == "__main__":
-    import numpy as np
     from src.terrain.heightmap_generator import generate_heightmap
     from src.terrain.water_generator import WaterGenerator
     from src.roads.road_network import RoadNetwork
@@ -23,8 +23,8 @@ if __name__ == "__main__":
     road_network.generate_organic_network(heightmap, water_map)
 
     node = ZoningNode()
-    result = node.process(heightmap, water_map, road_network.roads)
+    result = node.process(heightmap, water_map, road_network)
     print(f"Zoning map shape: {result['zoning_map'].shape}")
-    unique, counts = np.unique(result['zoning_map'], return_counts=True)
-    for zone, count in zip(unique, counts):
-        print(f"Zone {zone}: {count} tiles ({count / (256 * 256) * 100:.2f}%)")
\ No newline at end of file
+    for zone, count in enumerate(node.zoning.zone_counts()):
+        if count:
+            print(f"Zone {zone} ({ZONE_NAMES[zone]}): {count} tiles ({count / (256 * 256) * 100:.2f}%)")
\ No newline at end of file
@@ -0,0 +1,150 @@
+import numpy as np
+from scipy.ndimage import distance_transform_edt
+from src.utils.math_utils import summed_area_table, window_sum
+
+class RoadProximityIndex:
+    """Precomputed road proximity queries: distance field, nearest road cell and road-count table.
+
+    Built once per road layout; every query afterwards is O(1).
+    """
+
+    def __init__(self, roads):
+        self.height, self.width = roads.shape
+        self.build(roads)
+
+    def build(self, roads):
+        if roads.any():
+            distance, (nearest_y, nearest_x) = distance_transform_edt(~roads, return_indices=True)
+            self.distance = distance.astype(np.float32)
+            self.nearest = (nearest_y * self.width + nearest_x).astype(np.int32)
+        else:
+            self.distance = np.full(roads.shape, np.inf, dtype=np.float32)
+            self.nearest = np.full(roads.shape, -1, dtype=np.int32)
+        self.sat = summed_area_table(roads)
+
+    def update(self, road_window, x0, y0, x1, y1, radius):
+        """Refresh the index after roads changed only inside x0 <= x < x1, y0 <= y < y1.
+
+        ``road_window(window)`` must return the current road mask for a
+        ``(slice_y, slice_x)`` window. Distances are recomputed for cells
+        within ``radius`` of the edit from a window padded by another
+        ``radius``. Cells that window cannot settle, and cells anywhere whose
+        nearest road was removed, are then recomputed from windows grown until
+        each answer is exact. Farther cells whose nearest road survives keep
+        their value unless it exceeds ``radius``, so an edit that only adds
+        roads stays local and every answer up to ``radius`` is exact.
+        """
+        if self.sat[-1, -1] == 0:
+            # Every cell pointed at no road at all
+            self.build(road_window(np.s_[:, :]))
+            return
+        # Summed-area table: add the 2D prefix sum of the change to everything below/right of it
+        roads = road_window(np.s_[y0:y1, x0:x1]).astype(self.sat.dtype)
+        sat = self.sat
+        old = sat[y0 + 1:y1 + 1, x0 + 1:x1 + 1] - sat[y0:y1, x0 + 1:x1 + 1] - sat[y0 + 1:y1 + 1, x0:x1] + sat[y0:y1, x0:x1]
+        removed = bool(np.any(old > roads))
+        delta = np.cumsum(np.cumsum(roads - old, axis=0), axis=1)
+        sat[y0 + 1:y1 + 1, x0 + 1:x1 + 1] += delta
+        sat[y0 + 1:y1 + 1, x1 + 1:] += delta[:, -1:]
+        sat[y1 + 1:, x0 + 1:x1 + 1] += delta[-1:, :]
+        sat[y1 + 1:, x1 + 1:] += delta[-1, -1]
+
+        rx0, ry0 = max(0, x0 - radius), max(0, y0 - radius)
+        rx1, ry1 = min(self.width, x1 + radius), min(self.height, y1 + radius)
+        region = np.s_[ry0:ry1, rx0:rx1]
+        ys, xs = np.mgrid[region]
+        distance, nearest, exact = self._window_distances(road_window, xs.ravel(), ys.ravel(), radius)
+        distance, nearest, exact = (a.reshape(xs.shape) for a in (distance, nearest, exact))
+        old_distance, old_nearest = self.distance[region], self.nearest[region]
+        # A previous answer stays valid while its road still exists and is closer than anything in the window
+        keep_old = self._is_road(old_nearest) & (old_distance < distance)
+        self.distance[region] = np.where(keep_old, old_distance, distance)
+        self.nearest[region] = np.where(keep_old, old_nearest, nearest)
+
+        unsettled = [(ys * self.width + xs)[~keep_old & ~exact]]
+        if removed:
+            # Cells anywhere may have pointed at a road inside the edit that is now gone
+            nearest = self.nearest.ravel()
+            # Rows y0..y1 are one contiguous flat range; narrow to those before testing columns
+            candidates = np.flatnonzero((nearest >= y0 * self.width) & (nearest < y1 * self.width))
+            nearest_x = nearest[candidates] % self.width
+            candidates = candidates[(nearest_x >= x0) & (nearest_x < x1)]
+            unsettled.append(candidates[~self._is_road(nearest[candidates])])
+        cells = np.unique(np.concatenate(unsettled))
+        padding = radius
+        while cells.size:
+            ys, xs = np.divmod(cells, self.width)
+            distance, nearest, exact = self._window_distances(road_window, xs, ys, padding)
+            self.distance.ravel()[cells[exact]] = distance[exact]
+            self.nearest.ravel()[cells[exact]] = nearest[exact]
+            cells = cells[~exact]
+            padding *= 4
+
+    def _is_road(self, index):
+        # Whether flat cell indices (-1 for none) are currently road, from the summed-area table
+        x, y = index % self.width, index // self.width
+        sat = self.sat
+        return (index >= 0) & (sat[y + 1, x + 1] - sat[y, x + 1] - sat[y + 1, x] + sat[y, x] > 0)
+
+    def _window_distances(self, road_window, xs, ys, padding):
+        # Distance and nearest road for cells (xs, ys) from the roads in their bounding box grown by
+        # ``padding``, and whether that is exact: no road outside the window can be closer
+        wx0, wy0 = max(0, int(xs.min()) - padding), max(0, int(ys.min()) - padding)
+        wx1, wy1 = min(self.width, int(xs.max()) + padding + 1), min(self.height, int(ys.max()) + padding + 1)
+        context = road_window(np.s_[wy0:wy1, wx0:wx1])
+        if context.any():
+            distance, (nearest_y, nearest_x) = distance_transform_edt(~context, return_indices=True)
+            distance = distance[ys - wy0, xs - wx0]
+            nearest = (nearest_y[ys - wy0, xs - wx0] + wy0) * self.width + nearest_x[ys - wy0, xs - wx0] + wx0
+        else:
+            distance = np.full(xs.shape, np.inf)
+            nearest = np.full(xs.shape, -1)
+        # Any road outside the window is at least as far as the window edge on that side
+        border = np.full(xs.shape, np.inf)
+        if wx0 > 0:
+            border = np.minimum(border, xs - wx0 + 1)
+        if wy0 > 0:
+            border = np.minimum(border, ys - wy0 + 1)
+        if wx1 < self.width:
+            border = np.minimum(border, wx1 - xs)
+        if wy1 < self.height:
+            border = np.minimum(border, wy1 - ys)
+        return distance, nearest, distance <= border
+
+    def distance_to_road(self, x, y):
+        return float(self.distance[y, x])
+
+    def nearest_road(self, x, y):
+        """(x, y) of the closest road cell, or None when there are no roads."""
+        index = int(self.nearest[y, x])
+        if index < 0:
+            return None
+        return index % self.width, index // self.width
+
+    def road_count(self, x0, y0, x1, y1):
+        """Number of road cells with x0 <= x < x1 and y0 <= y < y1."""
+        return int(window_sum(self.sat, x0, y0, x1, y1))
+
+    def has_road_near(self, x, y, radius):
+        """Any road within the square of half-size ``radius`` around (x, y)."""
+        return self.road_count(x - radius, y - radius, x + radius + 1, y + radius + 1) > 0
+
+if __name__ == "__main__":
+    import time
+
+    size = 2048
+    roads = np.zeros((size, size), dtype=bool)
+    roads[::64, :] = True
+    roads[:, ::96] = True
+    start = time.perf_counter()
+    index = RoadProximityIndex(roads)
+    print(f"{size}x{size}: proximity index built in {time.perf_counter() - start:.3f}s")
+    print(f"Distance from (30, 30): {index.distance_to_road(30, 30):.2f}, nearest road: {index.nearest_road(30, 30)}")
+    print(f"Roads in [10, 40) x [10, 40): {index.road_count(10, 10, 40, 40)}")
+
+    # Remove one road: cells far from the edit must not keep pointing at it
+    roads[64, :] = False
+    start = time.perf_counter()
+    index.update(lambda window: roads[window], 0, 64, size, 65, radius=16)
+    stale = np.count_nonzero(~roads.ravel()[index.nearest.ravel()])
+    print(f"Road removed and index updated in {time.perf_counter() - start:.3f}s, {stale} cells pointing at removed roads")
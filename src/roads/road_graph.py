@@ -0,0 +1,199 @@
+import numpy as np
+from scipy.ndimage import label
+
+EIGHT_CONNECTED = np.ones((3, 3), dtype=bool)
+NEIGHBOUR_OFFSETS = [(-1, -1), (-1, 0), (-1, 1), (0, 1), (1, 1), (1, 0), (1, -1), (0, -1)]
+
+def _shifted(padded, dy, dx):
+    height, width = padded.shape[0] - 2, padded.shape[1] - 2
+    return padded[1 + dy:1 + dy + height, 1 + dx:1 + dx + width]
+
+def thin_staircases(mask):
+    """Drop the corner pixels of 4-connected staircases, leaving 8-connected diagonal lines.
+
+    A corner pixel has exactly two 4-neighbours, at right angles, with the
+    diagonal between them and the one opposite empty, so its neighbours stay
+    joined without it. Pixels are removed in two checkerboard phases; pixels
+    of one phase never hold each other's 4-neighbours, so removing them
+    together keeps every line connected.
+    """
+    padded = np.pad(mask.astype(bool), 1)
+    core = padded[1:-1, 1:-1]
+    height, width = core.shape
+    phase = np.add.outer(np.arange(height), np.arange(width)) % 2
+    changed = True
+    while changed:
+        changed = False
+        for parity in range(2):
+            n, e, s, w = (_shifted(padded, dy, dx) for dy, dx in ((-1, 0), (0, 1), (1, 0), (0, -1)))
+            ne, se, sw, nw = (_shifted(padded, dy, dx) for dy, dx in ((-1, 1), (1, 1), (1, -1), (-1, -1)))
+            corner = ((n & e & ~s & ~w & ~ne & ~sw) | (e & s & ~n & ~w & ~se & ~nw) |
+                      (s & w & ~n & ~e & ~sw & ~ne) | (w & n & ~s & ~e & ~nw & ~se))
+            remove = core & corner & (phase == parity)
+            if remove.any():
+                core[remove] = False
+                changed = True
+    return core.copy()
+
+def branch_count(skeleton):
+    """Number of separate skeleton branches meeting at each pixel (Yokoi 8-connectivity number).
+
+    1 at dead ends, 2 along a line, 3 or more at junctions.
+    """
+    padded = np.pad(skeleton.astype(np.int8), 1)
+    # Complements around the ring, from east anticlockwise; even entries are 4-neighbours
+    x = [1 - _shifted(padded, dy, dx) for dy, dx in ((0, 1), (-1, 1), (-1, 0), (-1, -1),
+                                                    (0, -1), (1, -1), (1, 0), (1, 1))]
+    return sum(x[k] - x[k] * x[k + 1] * x[(k + 2) % 8] for k in (0, 2, 4, 6))
+
+def skeletonize(mask):
+    """Thin a boolean raster to one-pixel-wide, 8-connected centre lines (Zhang-Suen).
+
+    Every pass of the two sub-iterations is evaluated on whole arrays.
+    Staircases are first turned into diagonal lines, which Zhang-Suen would
+    otherwise erode from their free end, and corners it leaves behind are
+    dropped afterwards.
+    """
+    skeleton = np.pad(thin_staircases(mask).astype(np.uint8), 1)
+    # P2..P9 clockwise from north, as in the original paper
+    order = [(-1, 0), (-1, 1), (0, 1), (1, 1), (1, 0), (1, -1), (0, -1), (-1, -1)]
+    changed = True
+    while changed:
+        changed = False
+        for step in range(2):
+            p = [_shifted(skeleton, dy, dx) for dy, dx in order]
+            neighbours = sum(p[i].astype(np.int8) for i in range(8))
+            transitions = sum(((p[i] == 0) & (p[(i + 1) % 8] == 1)).astype(np.int8) for i in range(8))
+            if step == 0:
+                side = (p[0] * p[2] * p[4] == 0) & (p[2] * p[4] * p[6] == 0)
+            else:
+                side = (p[0] * p[2] * p[6] == 0) & (p[0] * p[4] * p[6] == 0)
+            core = skeleton[1:-1, 1:-1]
+            remove = (core == 1) & (neighbours >= 2) & (neighbours <= 6) & (transitions == 1) & side
+            if remove.any():
+                core[remove] = 0
+                changed = True
+    return thin_staircases(skeleton[1:-1, 1:-1])
+
+class RoadGraph:
+    """Intersections and road segments extracted from a road raster, in CSR form.
+
+    Nodes are clusters of skeleton pixels that are not plain path pixels
+    (dead ends and junctions); clusters that are only bends in one road
+    belong to its chain. Each chain of path pixels joining two nodes is
+    one undirected edge. ``offsets``/``neighbours``/``edge_lengths``/
+    ``slope_costs``/``edge_ids`` hold both directions of every edge, so the
+    neighbours of node ``n`` are ``neighbours[offsets[n]:offsets[n + 1]]``.
+    """
+
+    def __init__(self, roads, heightmap=None):
+        self.height, self.width = roads.shape
+        self.build(roads, heightmap)
+
+    def build(self, roads, heightmap=None):
+        skeleton = skeletonize(roads)
+        padded = np.pad(skeleton, 1)
+        degree = sum(_shifted(padded, dy, dx).astype(np.int8) for dy, dx in NEIGHBOUR_OFFSETS)
+        # Pixels off plain paths cluster around each node. A cluster that holds no dead end and
+        # meets exactly two chain ends is only a bend, so it joins the chain it sits on
+        branches = branch_count(skeleton)
+        off_path = skeleton & ((degree != 2) | (branches != 2))
+        clusters, cluster_count = label(off_path, structure=EIGHT_CONNECTED)
+        paths, _ = label(skeleton & ~off_path, structure=EIGHT_CONNECTED)
+        # Path pixels have two neighbours, so only a path's end pixels touch a cluster
+        padded_clusters = np.pad(clusters, 1)
+        flat_paths = np.arange(paths.size).reshape(paths.shape)
+        ends, touched = [], []
+        for dy, dx in NEIGHBOUR_OFFSETS:
+            neighbour = _shifted(padded_clusters, dy, dx)
+            contact = (paths > 0) & (neighbour > 0)
+            ends.append(flat_paths[contact])
+            touched.append(neighbour[contact])
+        contacts = np.unique(np.stack([np.concatenate(ends), np.concatenate(touched)], axis=1), axis=0)
+        is_node = np.bincount(contacts[:, 1], minlength=cluster_count + 1) != 2
+        is_node[clusters[off_path & (branches != 2)]] = True
+        is_node[0] = False
+        node_ids = np.concatenate([[0], np.cumsum(is_node[1:])]) * is_node
+        node_labels = node_ids[clusters]
+        node_count = int(is_node.sum())
+        chain_labels, chain_count = label(skeleton & (node_labels == 0), structure=EIGHT_CONNECTED)
+
+        # Which node clusters each chain touches
+        padded_nodes = np.pad(node_labels, 1)
+        chain_ids, touched = [], []
+        for dy, dx in NEIGHBOUR_OFFSETS:
+            neighbour = _shifted(padded_nodes, dy, dx)
+            contact = (chain_labels > 0) & (neighbour > 0)
+            chain_ids.append(chain_labels[contact])
+            touched.append(neighbour[contact])
+        pairs = np.unique(np.stack([np.concatenate(chain_ids), np.concatenate(touched)], axis=1), axis=0)
+
+        # A chain touching two or more node clusters joins consecutive pairs of them.
+        # Chains touching a single cluster are loops and are dropped.
+        same_chain = pairs[1:, 0] == pairs[:-1, 0]
+        self.edge_sources = (pairs[:-1, 1][same_chain] - 1).astype(np.int32)
+        self.edge_targets = (pairs[1:, 1][same_chain] - 1).astype(np.int32)
+        edge_chains = pairs[:-1, 0][same_chain].astype(np.int64)
+
+        pixel_counts = np.bincount(chain_labels.ravel(), minlength=chain_count + 1)
+        self.segment_lengths = (pixel_counts[edge_chains] + 1).astype(np.float32)
+        if heightmap is not None:
+            slope = np.hypot(*np.gradient(heightmap))
+            slope_sums = np.bincount(chain_labels.ravel(), weights=slope.ravel(), minlength=chain_count + 1)
+            self.segment_slope_costs = slope_sums[edge_chains].astype(np.float32)
+        else:
+            self.segment_slope_costs = np.zeros(edge_chains.size, dtype=np.float32)
+
+        # Node centroids
+        ys, xs = np.nonzero(node_labels)
+        ids = node_labels[ys, xs] - 1
+        sizes = np.bincount(ids, minlength=node_count)
+        self.node_x = (np.bincount(ids, weights=xs, minlength=node_count) / np.maximum(sizes, 1)).astype(np.float32)
+        self.node_y = (np.bincount(ids, weights=ys, minlength=node_count) / np.maximum(sizes, 1)).astype(np.float32)
+        self.node_count = node_count
+
+        # Skeleton pixels of each edge, kept flat for painting results back onto the map
+        chain_to_edge = np.full(chain_count + 1, -1, dtype=np.int32)
+        chain_to_edge[edge_chains] = np.arange(edge_chains.size, dtype=np.int32)
+        flat_chains = chain_labels.ravel()
+        self.pixel_index = np.flatnonzero(flat_chains).astype(np.int64)
+        self.pixel_edge = chain_to_edge[flat_chains[self.pixel_index]]
+        self.skeleton = skeleton
+
+        self._build_csr()
+
+    def _build_csr(self):
+        nodes = np.concatenate([self.edge_sources, self.edge_targets])
+        order = np.argsort(nodes, kind='stable')
+        edge_ids = np.concatenate([np.arange(self.edge_count)] * 2)
+        self.neighbours = np.concatenate([self.edge_targets, self.edge_sources])[order].astype(np.int32)
+        self.edge_ids = edge_ids[order].astype(np.int32)
+        self.edge_lengths = self.segment_lengths[self.edge_ids]
+        self.slope_costs = self.segment_slope_costs[self.edge_ids]
+        self.offsets = np.zeros(self.node_count + 1, dtype=np.int64)
+        np.cumsum(np.bincount(nodes, minlength=self.node_count), out=self.offsets[1:])
+
+    @property
+    def edge_count(self):
+        return self.edge_sources.size
+
+    def degree(self, node=None):
+        degrees = np.diff(self.offsets)
+        return degrees if node is None else int(degrees[node])
+
+    def node_neighbours(self, node):
+        return self.neighbours[self.offsets[node]:self.offsets[node + 1]]
+
+if __name__ == "__main__":
+    import time
+    from src.terrain.heightmap_generator import generate_heightmap
+    from src.roads.road_network import RoadNetwork
+
+    size = 1024
+    heightmap = generate_heightmap(size, size)
+    network = RoadNetwork(size, size)
+    network.generate_organic_network(heightmap, np.zeros((size, size), dtype=bool), max_roads=500_000, max_slope=0.02)
+    start = time.perf_counter()
+    graph = network.road_graph()
+    print(f"{size}x{size}: {np.sum(network.roads)} road tiles -> {graph.node_count} intersections, "
+          f"{graph.edge_count} segments in {time.perf_counter() - start:.3f}s")
@@ -1,46 +1,231 @@
 import numpy as np
+from scipy.ndimage import label
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import dijkstra, minimum_spanning_tree
+from src.utils.rng import make_rng
+from src.utils.layer_raster import LayerRaster, ROAD, MAIN_ROAD
+from src.roads.road_graph import RoadGraph
+from src.roads.proximity import RoadProximityIndex
+from src.roads.routing import grid_graph, slope_cost_grid
+
+def _union_region(a, b):
+    if a is None:
+        return b
+    return min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3])
 
 class RoadNetwork:
-    def __init__(self, width, height):
+    def __init__(self, width, height, rng=None, layers=None):
         self.width = width
         self.height = height
-        self.roads = np.zeros((height, width), dtype=bool)
-        self.main_roads = np.zeros((height, width), dtype=bool)
+        self.rng = make_rng(rng)
+        # Road flags live in a (possibly shared) bit-packed layer raster
+        self.layers = layers if layers is not None else LayerRaster(width, height)
+        self.heightmap = None
+        # Bumped on every road change; derived structures rebuild when it moves
+        self.version = 0
+        self._graph = None
+        self._graph_version = -1
+        self._proximity = None
+        # Pending proximity work: None (clean), a bounding box or "all"
+        self._proximity_dirty = "all"
+        # Local edits keep the distance field exact within this many cells of the edit
+        self.edit_radius = 16
+        # Bounding box (x0, y0, x1, y1) of local edits not yet consumed downstream
+        self.edit_region = None
+
+    def _touch(self, region=None):
+        # Record a road change; region=None means the whole map may have changed
+        self.version += 1
+        # Some edits write the layer bits directly, past LayerRaster's own counter
+        self.layers.version += 1
+        if region is None or self._proximity_dirty == "all":
+            self._proximity_dirty = "all"
+        else:
+            self._proximity_dirty = _union_region(self._proximity_dirty, region)
+        if region is not None:
+            self.edit_region = _union_region(self.edit_region, region)
+
+    def pop_edit_region(self):
+        """Return and clear the bounding box of local road edits since the last call."""
+        region, self.edit_region = self.edit_region, None
+        return region
+
+    @property
+    def roads(self):
+        return self.layers.test(ROAD)
+
+    @roads.setter
+    def roads(self, mask):
+        self.layers.assign(ROAD, mask)
+        self._touch()
+
+    @property
+    def main_roads(self):
+        return self.layers.test(MAIN_ROAD)
+
+    @main_roads.setter
+    def main_roads(self, mask):
+        self.layers.assign(MAIN_ROAD, mask)
+        self._touch()
     
     def add_road(self, x, y, is_main=False):
         if 0 <= x < self.width and 0 <= y < self.height:
-            self.roads[y, x] = True
-            if is_main:
-                self.main_roads[y, x] = True
+            self.layers.bits[y, x] |= ROAD | MAIN_ROAD if is_main else ROAD
+            self._touch((x, y, x + 1, y + 1))
     
+    def remove_road(self, x, y):
+        if 0 <= x < self.width and 0 <= y < self.height:
+            self.layers.bits[y, x] &= ~(ROAD | MAIN_ROAD) & 0xFF
+            self._touch((x, y, x + 1, y + 1))
+
+    def _line_cells(self, x0, y0, x1, y1):
+        steps = max(abs(x1 - x0), abs(y1 - y0)) + 1
+        xs = np.rint(np.linspace(x0, x1, steps)).astype(np.intp)
+        ys = np.rint(np.linspace(y0, y1, steps)).astype(np.intp)
+        inside = (xs >= 0) & (xs < self.width) & (ys >= 0) & (ys < self.height)
+        return xs[inside], ys[inside]
+
+    def add_road_line(self, x0, y0, x1, y1, is_main=False):
+        """Draw a straight road from (x0, y0) to (x1, y1) as a single edit."""
+        xs, ys = self._line_cells(x0, y0, x1, y1)
+        if xs.size:
+            self.layers.set(ROAD | MAIN_ROAD if is_main else ROAD, (ys, xs))
+            self._touch((int(xs.min()), int(ys.min()), int(xs.max()) + 1, int(ys.max()) + 1))
+
+    def remove_road_line(self, x0, y0, x1, y1):
+        xs, ys = self._line_cells(x0, y0, x1, y1)
+        if xs.size:
+            self.layers.clear(ROAD | MAIN_ROAD, (ys, xs))
+            self._touch((int(xs.min()), int(ys.min()), int(xs.max()) + 1, int(ys.max()) + 1))
+
     def has_road(self, x, y):
         if 0 <= x < self.width and 0 <= y < self.height:
-            return self.roads[y, x]
+            return bool(self.layers.bits[y, x] & ROAD)
         return False
 
-    def generate_organic_network(self, heightmap, water_map, num_seeds=5, max_roads=1000, max_slope=0.1):
-        seeds = [(np.random.randint(0, self.width), np.random.randint(0, self.height)) 
+    @property
+    def proximity(self):
+        """Distance field, nearest-road index and road-count table, kept in step with road changes.
+
+        Bulk changes rebuild the index; local edits only update the area
+        within ``edit_radius`` of the edited cells.
+        """
+        if self._proximity is None or self._proximity_dirty == "all":
+            self._proximity = RoadProximityIndex(self.roads)
+        elif self._proximity_dirty is not None:
+            self._proximity.update(lambda window: self.layers.test(ROAD, window), *self._proximity_dirty,
+                                   radius=self.edit_radius)
+        self._proximity_dirty = None
+        return self._proximity
+
+    def road_graph(self):
+        """Intersection/segment graph of the current roads, rebuilt only after changes."""
+        if self._graph is None or self._graph_version != self.version:
+            self._graph = RoadGraph(self.roads, self.heightmap)
+            self._graph_version = self.version
+        return self._graph
+
+    def label_components(self):
+        """Label 4-connected road components; returns ``(labels, sizes)`` with ``sizes[i - 1]`` for label ``i``."""
+        labels, count = label(self.roads)
+        return labels, np.bincount(labels.ravel(), minlength=count + 1)[1:]
+
+    def connect_components(self, heightmap, water_map, slope_weight=10.0, water_cost=20.0):
+        """Join every road component into one network along least-cost bridges.
+
+        One multi-source Dijkstra from all road cells partitions the map by
+        nearest component. Adjacent cells claimed by different components
+        give candidate bridges, and a minimum spanning tree over components
+        picks which to build. Crossing water is allowed but ``water_cost``
+        times more expensive. Returns the number of bridges added.
+        """
+        labels, sizes = self.label_components()
+        if sizes.size <= 1:
+            return 0
+
+        cost = slope_cost_grid(heightmap, slope_weight)
+        cost[water_map] *= water_cost
+        flat_cost = cost.ravel()
+        distances, predecessors, sources = dijkstra(grid_graph(cost), indices=np.flatnonzero(labels),
+                                                    min_only=True, return_predecessors=True)
+        owner = np.where(sources >= 0, labels.ravel()[np.maximum(sources, 0)], 0)
+
+        # Cheapest crossing between each pair of neighbouring regions
+        index = np.arange(self.width * self.height).reshape(self.height, self.width)
+        a = np.concatenate([index[:, :-1].ravel(), index[:-1, :].ravel()])
+        b = np.concatenate([index[:, 1:].ravel(), index[1:, :].ravel()])
+        crossing = (owner[a] != owner[b]) & (owner[a] > 0) & (owner[b] > 0)
+        a, b = a[crossing], b[crossing]
+        bridge_cost = distances[a] + distances[b] + 0.5 * (flat_cost[a] + flat_cost[b])
+        low, high = np.minimum(owner[a], owner[b]), np.maximum(owner[a], owner[b])
+        order = np.lexsort((bridge_cost, high, low))
+        first = np.concatenate([[True], (low[order][1:] != low[order][:-1]) | (high[order][1:] != high[order][:-1])])
+        best = order[first]
+
+        count = sizes.size + 1
+        component_graph = csr_matrix((bridge_cost[best], (low[best], high[best])), shape=(count, count))
+        tree = minimum_spanning_tree(component_graph).tocoo()
+        pair_to_best = {(int(l), int(h)): i for l, h, i in zip(low[best], high[best], best)}
+
+        bits = self.layers.bits.reshape(-1)
+        for l, h in zip(tree.row, tree.col):
+            crossing_index = pair_to_best[(min(l, h), max(l, h))]
+            for cell in (a[crossing_index], b[crossing_index]):
+                while cell >= 0:
+                    bits[cell] |= ROAD
+                    cell = predecessors[cell]
+        self._touch()
+        return tree.nnz
+
+    def generate_organic_network(self, heightmap, water_map, num_seeds=5, max_roads=1000, max_slope=0.1,
+                                 connect=True):
+        self.heightmap = heightmap
+        seeds = [(int(self.rng.integers(0, self.width)), int(self.rng.integers(0, self.height)))
                  for _ in range(num_seeds)]
         
         for seed in seeds:
             self.grow_road_from_seed(seed, heightmap, water_map, max_roads // num_seeds, max_slope, is_main=True)
 
+        if connect:
+            self.connect_components(heightmap, water_map)
+
     def grow_road_from_seed(self, seed, heightmap, water_map, max_roads, max_slope, is_main=False):
-        stack = [seed]
+        """Grow roads outwards from ``seed`` one whole frontier at a time.
+
+        Each step claims every frontier cell, then gathers the unclaimed,
+        dry, 4-connected neighbours reachable within ``max_slope``. When a
+        frontier would exceed the remaining budget, a random subset is kept.
+        """
+        flat_height = heightmap.reshape(-1)
+        flat_water = water_map.reshape(-1)
+        bits = self.layers.bits.reshape(-1)
+        flag = ROAD | MAIN_ROAD if is_main else ROAD
+
+        x, y = seed
+        frontier = np.array([y * self.width + x])
+        if bits[frontier[0]] & ROAD or flat_water[frontier[0]]:
+            return 0
+
         roads_added = 0
-        
-        while stack and roads_added < max_roads:
-            x, y = stack.pop()
-            if not self.has_road(x, y) and not water_map[y, x]:
-                self.add_road(x, y, is_main)
-                roads_added += 1
-                
-                for dx, dy in [(0, 1), (1, 0), (0, -1), (-1, 0)]:
-                    nx, ny = x + dx, y + dy
-                    if (0 <= nx < self.width and 0 <= ny < self.height and
-                        not water_map[ny, nx] and
-                        abs(heightmap[ny, nx] - heightmap[y, x]) <= max_slope):
-                        stack.append((nx, ny))
+        while frontier.size and roads_added < max_roads:
+            remaining = max_roads - roads_added
+            if frontier.size > remaining:
+                frontier = self.rng.choice(frontier, remaining, replace=False)
+            bits[frontier] |= flag
+            roads_added += frontier.size
+            self._touch()
+
+            fy, fx = np.divmod(frontier, self.width)
+            neighbours = []
+            for dx, dy in [(0, 1), (1, 0), (0, -1), (-1, 0)]:
+                inside = (fx + dx >= 0) & (fx + dx < self.width) & (fy + dy >= 0) & (fy + dy < self.height)
+                source = frontier[inside]
+                target = source + dy * self.width + dx
+                passable = ((bits[target] & ROAD) == 0) & ~flat_water[target] & \
+                    (np.abs(flat_height[target] - flat_height[source]) <= max_slope)
+                neighbours.append(target[passable])
+            frontier = np.unique(np.concatenate(neighbours))
+        return roads_added
 
 if __name__ == "__main__":
     from src.terrain.heightmap_generator import generate_heightmap
@@ -55,4 +240,25 @@ if __name__ == "__main__":
     network.generate_organic_network(heightmap, water_map)
     print(f"Road network created with shape: {network.roads.shape}")
     print(f"Total road tiles: {np.sum(network.roads)}")
-    print(f"Total main road tiles: {np.sum(network.main_roads)}")
\ No newline at end of file
+    print(f"Total main road tiles: {np.sum(network.main_roads)}")
+    labels, sizes = network.label_components()
+    print(f"Road components after bridging: {sizes.size}")
+
+    import time
+    size = 2048
+    heightmap = generate_heightmap(size, size)
+    network = RoadNetwork(size, size, rng=0)
+    water_map = np.zeros((size, size), dtype=bool)
+    start = time.perf_counter()
+    network.generate_organic_network(heightmap, water_map, max_roads=2_000_000, max_slope=0.02, connect=False)
+    print(f"{size}x{size}: grew {np.sum(network.roads)} road tiles in {time.perf_counter() - start:.3f}s")
+
+    # Forty small networks on both banks of a river, so bridging has real work to do
+    water_map[:, size // 2 - 8:size // 2 + 8] = True
+    network = RoadNetwork(size, size, rng=0)
+    network.generate_organic_network(heightmap, water_map, num_seeds=40, max_roads=size * 20, max_slope=0.01,
+                                     connect=False)
+    components = network.label_components()[1].size
+    start = time.perf_counter()
+    bridges = network.connect_components(heightmap, water_map)
+    print(f"{size}x{size}: joined {components} road components with {bridges} bridges in {time.perf_counter() - start:.3f}s")
@@ -0,0 +1,239 @@
+import numpy as np
+from scipy.ndimage import distance_transform_edt
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import dijkstra
+from src.utils.rng import make_rng
+from src.roads.routing import RoutingEngine
+from src.city.zone_types import RESIDENT_DENSITY, JOB_DENSITY
+
+def trip_demand(zones, num_trips=100_000, rng=None):
+    """Sample ``num_trips`` home-to-work trips from a zoning raster.
+
+    Origins are drawn from residential cells and destinations from commercial,
+    industrial and mixed-use cells, weighted by zone density. Returns
+    ``(origins, destinations)`` as ``(num_trips, 2)`` arrays of ``(x, y)`` cells.
+    """
+    rng = make_rng(rng)
+    width = zones.shape[1]
+    flat_zones = zones.ravel()
+
+    def sample(weights):
+        cell_weights = weights[flat_zones]
+        cells = np.flatnonzero(cell_weights)
+        if cells.size == 0:
+            return np.empty((0, 2), dtype=np.int64)
+        p = cell_weights[cells]
+        chosen = rng.choice(cells, num_trips, p=p / p.sum())
+        return np.column_stack([chosen % width, chosen // width])
+
+    origins, destinations = sample(RESIDENT_DENSITY), sample(JOB_DENSITY)
+    count = min(len(origins), len(destinations))
+    return origins[:count], destinations[:count]
+
+class TrafficAssignment:
+    """User-equilibrium traffic assignment over a ``RoadGraph`` (Frank-Wolfe).
+
+    Segment travel time follows the BPR curve ``t0 * (1 + alpha * (v / c) ** beta)``,
+    with free-flow time ``t0`` from a ``RoutingEngine``'s segment costs and
+    capacity ``c`` per segment. Flows are kept per segment in ``flows``;
+    ``gaps`` records the relative duality gap after every iteration.
+    """
+
+    def __init__(self, engine, capacity=200.0, alpha=0.15, beta=4.0):
+        self.engine = engine
+        self.graph = engine.graph
+        self.free_flow = engine.segment_costs
+        self.capacity = np.broadcast_to(np.asarray(capacity, dtype=np.float64), self.free_flow.shape).copy()
+        self.alpha = alpha
+        self.beta = beta
+        self.flows = np.zeros(self.graph.edge_count)
+        self.gaps = []
+        self.unassigned = 0
+
+        # Both directions of every segment, sorted by (tail, head) so parallel
+        # segments between the same intersections sit next to each other
+        n = self.graph.node_count
+        tails = np.concatenate([self.graph.edge_sources, self.graph.edge_targets]).astype(np.int64)
+        heads = np.concatenate([self.graph.edge_targets, self.graph.edge_sources]).astype(np.int64)
+        keys = tails * n + heads
+        order = np.argsort(keys, kind='stable')
+        self._arc_keys = keys[order]
+        self._arc_edges = np.concatenate([np.arange(self.graph.edge_count)] * 2)[order]
+        self._arc_starts = np.flatnonzero(np.diff(self._arc_keys, prepend=-1) != 0)
+        self._pair_keys = self._arc_keys[self._arc_starts]
+
+    @classmethod
+    def from_network(cls, road_network, capacity=200.0, main_road_factor=2.0, slope_weight=10.0, **kwargs):
+        """Assignment over the network's road graph; segments on main roads get ``main_road_factor`` times the capacity."""
+        engine = RoutingEngine.from_network(road_network, slope_weight)
+        graph = engine.graph
+        on_edge = graph.pixel_edge >= 0
+        pixels = np.bincount(graph.pixel_edge[on_edge], minlength=graph.edge_count)
+        main_pixels = np.bincount(graph.pixel_edge[on_edge], minlength=graph.edge_count,
+                                  weights=road_network.main_roads.ravel()[graph.pixel_index[on_edge]])
+        main_share = main_pixels / np.maximum(pixels, 1)
+        return cls(engine, capacity * (1.0 + (main_road_factor - 1.0) * main_share), **kwargs)
+
+    def travel_times(self, flows=None):
+        flows = self.flows if flows is None else flows
+        return self.free_flow * (1.0 + self.alpha * (flows / self.capacity) ** self.beta)
+
+    @property
+    def volume_capacity(self):
+        return self.flows / self.capacity
+
+    def _cheapest_arcs(self, costs):
+        # Cost matrix keeping the cheapest of parallel segments, and which segment that is
+        arc_costs = costs[self._arc_edges]
+        order = np.lexsort((arc_costs, self._arc_keys))
+        best = order[self._arc_starts]
+        n = self.graph.node_count
+        matrix = csr_matrix((arc_costs[best], (self._pair_keys // n, self._pair_keys % n)), shape=(n, n))
+        return matrix, self._arc_edges[best]
+
+    def all_or_nothing(self, costs, origin_nodes, destination_nodes, demand, batch_size=64):
+        """Load all demand onto the cheapest paths under ``costs``; returns per-segment flows.
+
+        Demand is grouped by origin so each distinct origin costs one Dijkstra
+        sweep. The shortest-path trees of a batch of origins are loaded
+        together, one tree depth at a time from the leaves up.
+        """
+        n = self.graph.node_count
+        matrix, pair_edges = self._cheapest_arcs(costs)
+        flows = np.zeros(self.graph.edge_count)
+        self.unassigned = 0
+
+        order = np.argsort(origin_nodes, kind='stable')
+        origin_nodes, destination_nodes, demand = origin_nodes[order], destination_nodes[order], demand[order]
+        unique_origins, first = np.unique(origin_nodes, return_index=True)
+        bounds = np.append(first, origin_nodes.size)
+
+        for start in range(0, unique_origins.size, batch_size):
+            batch = unique_origins[start:start + batch_size]
+            trips = np.s_[bounds[start]:bounds[start + batch.size]]
+            rows = np.repeat(np.arange(batch.size), np.diff(bounds[start:start + batch.size + 1]))
+            load = np.zeros(batch.size * n)
+            np.add.at(load, rows * n + destination_nodes[trips], demand[trips])
+
+            _, predecessors = dijkstra(matrix, indices=batch, return_predecessors=True)
+            predecessors = predecessors.astype(np.int64)
+            has_parent = predecessors >= 0
+            unreached = ~has_parent
+            unreached[np.arange(batch.size), batch] = False
+            self.unassigned += load.reshape(batch.size, n)[unreached].sum()
+
+            child, parent, depth = self._tree_levels(predecessors, has_parent)
+            level_bounds = np.flatnonzero(np.diff(depth)) + 1
+            for level in np.split(np.arange(child.size), level_bounds):
+                np.add.at(load, parent[level], load[child[level]])
+
+            loaded = load[child] > 0
+            tail, head = parent[loaded] % n, child[loaded] % n
+            edges = pair_edges[np.searchsorted(self._pair_keys, tail * n + head)]
+            flows += np.bincount(edges, weights=load[child[loaded]], minlength=self.graph.edge_count)
+        return flows
+
+    @staticmethod
+    def _tree_levels(predecessors, has_parent):
+        # Depth of every node in every tree by pointer doubling, then the flat
+        # (child, parent) links ordered from the deepest level up
+        batch, n = predecessors.shape
+        row_offset = (np.arange(batch) * n)[:, np.newaxis]
+        nodes = np.arange(batch * n).reshape(batch, n)
+        jump = np.where(has_parent, predecessors + row_offset, nodes).ravel()
+        depth = has_parent.ravel().astype(np.int64)
+        while True:
+            next_jump = jump[jump]
+            if np.array_equal(next_jump, jump):
+                break
+            depth += depth[jump]
+            jump = next_jump
+        child = np.flatnonzero(has_parent)
+        order = np.argsort(-depth[child], kind='stable')
+        child = child[order]
+        parent = (predecessors.ravel()[child] + child // n * n)
+        return child, parent, depth[child]
+
+    def _line_search(self, flows, target, steps=20):
+        # Bisection on the derivative of the Beckmann objective along flows -> target
+        direction = target - flows
+        low, high = 0.0, 1.0
+        for _ in range(steps):
+            mid = 0.5 * (low + high)
+            if np.dot(direction, self.travel_times(flows + mid * direction)) > 0:
+                high = mid
+            else:
+                low = mid
+        return 0.5 * (low + high)
+
+    def assign(self, origins, destinations, iterations=10, tolerance=1e-3, batch_size=64):
+        """Assign ``(x, y)`` origin/destination trips; returns the equilibrium segment flows.
+
+        Trips are snapped to their nearest intersections and identical
+        intersection pairs merged. Trips starting and ending at the same
+        intersection put no load on the network. Without intersections every
+        trip is left unassigned.
+        """
+        n = self.graph.node_count
+        self.gaps = []
+        if n == 0:
+            self.flows = np.zeros(self.graph.edge_count)
+            self.unassigned = float(len(origins))
+            return self.flows
+        origin_nodes, _ = self.engine.snap(origins)
+        destination_nodes, _ = self.engine.snap(destinations)
+        pairs, demand = np.unique(origin_nodes.astype(np.int64) * n + destination_nodes, return_counts=True)
+        origin_nodes, destination_nodes = pairs // n, pairs % n
+        moving = origin_nodes != destination_nodes
+        od = (origin_nodes[moving], destination_nodes[moving], demand[moving].astype(np.float64))
+
+        self.flows = self.all_or_nothing(self.free_flow, *od, batch_size=batch_size)
+        for _ in range(iterations):
+            costs = self.travel_times()
+            target = self.all_or_nothing(costs, *od, batch_size=batch_size)
+            total = np.dot(self.flows, costs)
+            gap = np.dot(self.flows - target, costs) / total if total > 0 else 0.0
+            self.gaps.append(gap)
+            if gap < tolerance:
+                break
+            self.flows += self._line_search(self.flows, target) * (target - self.flows)
+        return self.flows
+
+    def congestion_raster(self, roads):
+        """Volume/capacity ratio on every road cell, taken from the nearest segment pixel."""
+        height, width = roads.shape
+        graph = self.graph
+        on_edge = graph.pixel_edge >= 0
+        painted = np.zeros(height * width, dtype=np.float32)
+        painted[graph.pixel_index[on_edge]] = self.volume_capacity[graph.pixel_edge[on_edge]]
+        if not on_edge.any():
+            return painted.reshape(height, width)
+        has_value = np.zeros(height * width, dtype=bool)
+        has_value[graph.pixel_index[on_edge]] = True
+        _, (nearest_y, nearest_x) = distance_transform_edt(~has_value.reshape(height, width), return_indices=True)
+        congestion = painted.reshape(height, width)[nearest_y, nearest_x]
+        congestion[~roads] = 0
+        return congestion
+
+if __name__ == "__main__":
+    import time
+    from src.terrain.heightmap_generator import generate_heightmap
+    from src.roads.road_network import RoadNetwork
+    from src.city.zoning import Zoning
+
+    size = 1024
+    heightmap = generate_heightmap(size, size)
+    water_map = np.zeros((size, size), dtype=bool)
+    network = RoadNetwork(size, size, rng=0)
+    network.generate_organic_network(heightmap, water_map, max_roads=size * size // 2, max_slope=0.02)
+    zoning = Zoning(size, size)
+    zoning.generate_sophisticated_zoning(water_map, network)
+
+    origins, destinations = trip_demand(zoning.zones, 100_000, rng=0)
+    traffic = TrafficAssignment.from_network(network)
+    start = time.perf_counter()
+    traffic.assign(origins, destinations)
+    print(f"{size}x{size}: assigned {len(origins)} trips over {traffic.graph.edge_count} segments "
+          f"in {time.perf_counter() - start:.3f}s, relative gap {traffic.gaps[-1]:.4f}")
+    congestion = traffic.congestion_raster(network.roads)
+    print(f"Road cells over capacity: {np.mean(congestion[network.roads] > 1) * 100:.1f}%")
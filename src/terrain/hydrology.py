@@ -0,0 +1,239 @@
+import numpy as np
+from scipy.ndimage import binary_dilation, label
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import breadth_first_order, minimum_spanning_tree
+
+# D8 neighbour offsets (dy, dx), indexed by flow direction code 0-7
+D8_OFFSETS = np.array([(-1, 0), (-1, 1), (0, 1), (1, 1), (1, 0), (1, -1), (0, -1), (-1, -1)])
+D8_DISTANCES = np.hypot(D8_OFFSETS[:, 0], D8_OFFSETS[:, 1])
+NO_FLOW = -1
+# Waves holding more than 1/DENSE_WAVE of all cells are accumulated with full-length counts
+DENSE_WAVE = 8
+
+def flow_direction(heightmap):
+    """D8 steepest-descent direction code per cell, or NO_FLOW for pits and map edges.
+
+    Edge cells drain off the map, so they never pass flow back inwards.
+    """
+    height, width = heightmap.shape
+    padded = np.pad(heightmap, 1, mode='constant', constant_values=np.inf)
+    best_drop = np.zeros((height, width))
+    direction = np.full((height, width), NO_FLOW, dtype=np.int8)
+    drop = np.empty((height, width))
+    steeper = np.empty((height, width), dtype=bool)
+    for code, ((dy, dx), distance) in enumerate(zip(D8_OFFSETS, D8_DISTANCES)):
+        neighbour = padded[1 + dy:1 + dy + height, 1 + dx:1 + dx + width]
+        np.subtract(heightmap, neighbour, out=drop)
+        drop /= distance
+        np.greater(drop, best_drop, out=steeper)
+        np.copyto(direction, code, where=steeper)
+        np.maximum(best_drop, drop, out=best_drop)
+    direction[0, :] = direction[-1, :] = direction[:, 0] = direction[:, -1] = NO_FLOW
+    return direction
+
+def flow_receivers(direction):
+    """Flat index of the downstream cell for every cell, or -1 where flow stops."""
+    height, width = direction.shape
+    flat_direction = direction.ravel()
+    receivers = np.full(flat_direction.shape, -1, dtype=np.intp)
+    flowing = np.flatnonzero(flat_direction != NO_FLOW)
+    offsets = D8_OFFSETS[:, 0] * width + D8_OFFSETS[:, 1]
+    receivers[flowing] = flowing + offsets[flat_direction[flowing]]
+    return receivers
+
+def flow_accumulation(receivers, shape, weights=None):
+    """Upstream contributing area (or summed ``weights``) per cell.
+
+    Cells are processed in topological waves: each wave is every cell whose
+    upstream cells are all done, so the total work is linear in the number of
+    cells plus a small per-wave overhead.
+    """
+    count = receivers.size
+    accumulation = np.ones(count) if weights is None else np.asarray(weights, dtype=np.float64).ravel().copy()
+    flowing = receivers >= 0
+    pending = np.bincount(receivers[flowing], minlength=count)
+    frontier = np.flatnonzero(pending == 0)
+    last = np.empty(count, dtype=np.intp)
+    while frontier.size:
+        frontier = frontier[receivers[frontier] >= 0]
+        downstream = receivers[frontier]
+        if frontier.size > count // DENSE_WAVE:
+            # Early waves cover much of the map, where full-length counts beat scattering
+            accumulation += np.bincount(downstream, accumulation[frontier], count)
+            arrived = np.bincount(downstream, minlength=count)
+            pending -= arrived
+            frontier = np.flatnonzero((pending == 0) & (arrived > 0))
+            continue
+        np.add.at(accumulation, downstream, accumulation[frontier])
+        np.subtract.at(pending, downstream, 1)
+        ready = downstream[pending[downstream] == 0]
+        # A receiver appears once per donor; keep only the entry written last, without sorting
+        order = np.arange(ready.size)
+        last[ready] = order
+        frontier = ready[last[ready] == order]
+    return accumulation.reshape(shape)
+
+def drainage_basins(receivers):
+    """Label every cell with the index of the sink its flow ends in.
+
+    Returns ``(labels, sinks)`` where ``sinks[labels]`` is each cell's terminal
+    cell. Uses pointer jumping, so it needs O(log path length) array passes.
+    """
+    root = receivers.copy()
+    stopped = root < 0
+    root[stopped] = np.flatnonzero(stopped)
+    while True:
+        jumped = root[root]
+        if np.array_equal(jumped, root):
+            break
+        root = jumped
+    sinks = np.flatnonzero(stopped)
+    basin_of_sink = np.empty(receivers.size, dtype=np.intp)
+    basin_of_sink[sinks] = np.arange(sinks.size)
+    return basin_of_sink[root], sinks
+
+def _basin_spill_edges(heightmap, labels):
+    # Lowest pass between each pair of adjacent basins: the pass height of a
+    # pair of neighbouring cells is the higher of the two.
+    labels = labels.reshape(heightmap.shape)
+    pairs = [(np.s_[:, :-1], np.s_[:, 1:]), (np.s_[:-1, :], np.s_[1:, :]),
+             (np.s_[:-1, :-1], np.s_[1:, 1:]), (np.s_[:-1, 1:], np.s_[1:, :-1])]
+    keys, weights = [], []
+    basin_count = np.int64(labels.max()) + 1
+    for a, b in pairs:
+        la, lb = labels[a], labels[b]
+        crossing = la != lb
+        la, lb = la[crossing], lb[crossing]
+        keys.append(np.minimum(la, lb) * basin_count + np.maximum(la, lb))
+        weights.append(np.maximum(heightmap[a][crossing], heightmap[b][crossing]))
+    keys, weights = np.concatenate(keys), np.concatenate(weights)
+    order = np.argsort(keys)
+    keys, weights = keys[order], weights[order]
+    starts = np.flatnonzero(np.concatenate([[True], keys[1:] != keys[:-1]]))
+    keys = keys[starts]
+    return keys // basin_count, keys % basin_count, np.minimum.reduceat(weights, starts)
+
+def priority_flood(heightmap):
+    """Fill every depression up to its spill level and return the filled surface.
+
+    Priority-flood runs over the basin graph rather than individual cells:
+    each D8 basin is a node, adjacent basins are joined by their lowest
+    pass, and a basin spills at the highest pass on its route to the map
+    edge through the graph's minimum spanning tree, the route whose highest
+    pass is lowest. Within a basin every
+    cell can reach the sink downhill, so a cell's filled height is the larger
+    of its own height and its basin's spill level.
+    """
+    height, width = heightmap.shape
+    receivers = flow_receivers(flow_direction(heightmap))
+    labels, sinks = drainage_basins(receivers)
+    basin_count = sinks.size
+    sink_y, sink_x = np.divmod(sinks, width)
+    outlet = (sink_y == 0) | (sink_y == height - 1) | (sink_x == 0) | (sink_x == width - 1)
+
+    sources, targets, weights = _basin_spill_edges(heightmap, labels)
+    # The tree sees passes by rank from 1, exact and positive, plus a root joined to every outlet basin at 0.5
+    passes, ranks = np.unique(weights, return_inverse=True)
+    outlets = np.flatnonzero(outlet)
+    root = basin_count
+    graph = coo_matrix((np.concatenate([ranks + 1.0, np.full(outlets.size, 0.5)]),
+                        (np.concatenate([sources, outlets]), np.concatenate([targets, np.full(outlets.size, root)]))),
+                       shape=(basin_count + 1, basin_count + 1))
+    tree = minimum_spanning_tree(graph).tocoo()
+    _, parent = breadth_first_order(tree, root, directed=False, return_predecessors=True)
+    child = np.where(parent[tree.row] == tree.col, tree.row, tree.col)
+    # Rank of the pass up to each basin's parent, 0 for the root and outlets
+    rank = np.zeros(basin_count + 1, dtype=np.intp)
+    rank[child] = tree.data.astype(np.intp)
+    parent[root] = root
+    # Pointer jumping takes the highest pass between each basin and the root
+    while True:
+        rank = np.maximum(rank, rank[parent])
+        jumped = parent[parent]
+        if np.array_equal(jumped, parent):
+            break
+        parent = jumped
+
+    spill = np.concatenate([[-np.inf], passes])[rank[:basin_count]]
+    return np.maximum(heightmap, spill[labels].reshape(height, width))
+
+def find_lakes(heightmap, min_volume=0.0):
+    """Fill depressions and label the resulting water bodies.
+
+    Returns ``(filled, lakes, volumes)``: the filled surface, an int32 raster of
+    lake ids (0 = dry land) and the water volume of each lake, where
+    ``volumes[i - 1]`` belongs to lake ``i``. Lakes below ``min_volume`` are dropped.
+    """
+    filled = priority_flood(heightmap)
+    depth = filled - heightmap
+    lakes, count = label(depth > 0, structure=np.ones((3, 3)))
+    volumes = np.bincount(lakes.ravel(), weights=depth.ravel(), minlength=count + 1)[1:]
+    if min_volume > 0:
+        keep = np.concatenate([[0], np.cumsum(volumes >= min_volume) * (volumes >= min_volume)])
+        lakes = keep[lakes]
+        filled = np.where(lakes > 0, filled, heightmap)
+        volumes = volumes[volumes >= min_volume]
+    return filled, lakes.astype(np.int32), volumes
+
+def drainage_direction(heightmap, filled=None):
+    """D8 directions under which every cell drains off the map edge.
+
+    Flow is routed over the depression-filled surface (``filled``, computed
+    with ``priority_flood`` when not given). Filled lakes and other flats have
+    no lower neighbour, so each flat cell instead points to an equal-height
+    neighbour one step closer to where the flat can be left, found by a
+    breadth-first search inwards from those exits.
+    """
+    filled = priority_flood(heightmap) if filled is None else filled
+    direction = flow_direction(filled)
+    height, width = filled.shape
+    # Padded flat indices, so neighbour offsets never wrap across rows
+    padded_width = width + 2
+    level = np.pad(filled, 1, mode='constant', constant_values=np.nan).ravel()
+    pending = np.zeros((height + 2, width + 2), dtype=bool)
+    pending[2:-2, 2:-2] = direction[1:-1, 1:-1] == NO_FLOW
+    if not pending.any():
+        return direction
+    codes = np.pad(direction, 1, mode='constant', constant_values=NO_FLOW).ravel()
+    pending = pending.ravel()
+    offsets = D8_OFFSETS[:, 0] * padded_width + D8_OFFSETS[:, 1]
+    # Exits: cells that drain, or sit on the edge, next to a flat cell
+    frontier = np.flatnonzero(binary_dilation(pending.reshape(height + 2, width + 2), np.ones((3, 3), dtype=bool)).ravel()
+                              & ~pending)
+    frontier = frontier[np.isfinite(level[frontier])]
+    while frontier.size:
+        reached = []
+        for code, offset in enumerate(offsets):
+            neighbour = frontier + offset
+            take = pending[neighbour] & (level[neighbour] == level[frontier])
+            neighbour = neighbour[take]
+            # The neighbour steps back along the opposite direction
+            codes[neighbour] = (code + 4) % 8
+            pending[neighbour] = False
+            reached.append(neighbour)
+        frontier = np.concatenate(reached)
+    return codes.reshape(height + 2, width + 2)[1:-1, 1:-1].copy()
+
+if __name__ == "__main__":
+    import time
+    from src.terrain.heightmap_generator import generate_heightmap
+
+    for size in (256, 1024, 2048, 4096):
+        heightmap = generate_heightmap(size, size)
+        start = time.perf_counter()
+        direction = flow_direction(heightmap)
+        accumulation = flow_accumulation(flow_receivers(direction), heightmap.shape)
+        elapsed = time.perf_counter() - start
+        print(f"{size}x{size}: D8 flow + accumulation in {elapsed:.3f}s, max accumulation {accumulation.max():.0f}")
+
+    for size in (1024, 4096):
+        heightmap = generate_heightmap(size, size)
+        start = time.perf_counter()
+        filled, lakes, volumes = find_lakes(heightmap)
+        elapsed = time.perf_counter() - start
+        print(f"{size}x{size}: priority-flood filled {volumes.size} lakes in {elapsed:.3f}s")
+        start = time.perf_counter()
+        accumulation = flow_accumulation(flow_receivers(drainage_direction(heightmap, filled)), heightmap.shape)
+        elapsed = time.perf_counter() - start
+        print(f"{size}x{size}: flats resolved and accumulated in {elapsed:.3f}s, "
+              f"{np.sum(accumulation >= 1000)} cells drain 1000+ cells")
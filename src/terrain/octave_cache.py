@@ -0,0 +1,78 @@
+from collections import OrderedDict
+
+import numpy as np
+from src.terrain.heightmap_generator import octave_layer
+
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+def octave_set_bytes(width, height, octaves):
+    """Bytes needed to cache every octave layer of one map."""
+    return octaves * width * height * np.dtype(np.float32).itemsize
+
+class OctaveCache:
+    """LRU cache of raw octave layers, bounded by total array bytes.
+
+    A raw layer only depends on its size, frequency, scale, seed and origin,
+    so changing persistence re-weights cached layers and adding an octave
+    computes just the new one. Layers are kept as float32. When a map's
+    octaves do not all fit, the ones already cached are kept rather than
+    evicted for the next octave of the same map, which would otherwise
+    leave nothing to reuse on the next sum.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.layers = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def layer(self, width, height, frequency, scale=50.0, seed=0, x0=0, y0=0):
+        key = (width, height, frequency, scale, seed, x0, y0)
+        layer = self.layers.get(key)
+        if layer is not None:
+            self.layers.move_to_end(key)
+            self.hits += 1
+            return layer
+
+        self.misses += 1
+        layer = octave_layer(width, height, frequency, scale, seed, x0, y0).astype(np.float32)
+        layer.setflags(write=False)
+        # Layers of the same map window, which the sum being computed reuses next time
+        window = (width, height, scale, seed, x0, y0)
+        while self.current_bytes + layer.nbytes > self.max_bytes:
+            evictable = next((old for old in self.layers if old[:2] + old[3:] != window), None)
+            if evictable is None:
+                return layer
+            self.current_bytes -= self.layers.pop(evictable).nbytes
+        self.layers[key] = layer
+        self.current_bytes += layer.nbytes
+        return layer
+
+    def clear(self):
+        self.layers.clear()
+        self.current_bytes = 0
+
+    def __len__(self):
+        return len(self.layers)
+
+if __name__ == "__main__":
+    import time
+    from src.terrain.heightmap_generator import generate_heightmap
+
+    cache = OctaveCache()
+    size = 1024
+    for label, params in [("cold", dict(persistence=0.5, octaves=6)),
+                          ("persistence change", dict(persistence=0.6, octaves=6)),
+                          ("added octave", dict(persistence=0.6, octaves=7))]:
+        start = time.perf_counter()
+        generate_heightmap(size, size, cache=cache, **params)
+        print(f"{label}: {time.perf_counter() - start:.3f}s "
+              f"({cache.hits} hits, {cache.misses} misses, {cache.current_bytes / 2**20:.0f} MiB cached)")
+
+    # A budget for only half the octaves still reuses that half on every change
+    cache = OctaveCache(max_bytes=octave_set_bytes(size, size, 3))
+    for persistence in (0.5, 0.6):
+        start = time.perf_counter()
+        generate_heightmap(size, size, cache=cache, persistence=persistence)
+        print(f"Half-size budget, persistence {persistence}: {time.perf_counter() - start:.3f}s ({cache.hits} hits)")
@@ -1,14 +1,39 @@
 import numpy as np
-from scipy.ndimage import gaussian_filter
+from scipy.ndimage import gaussian_filter, binary_dilation
+from src.terrain.hydrology import drainage_direction, flow_receivers, flow_accumulation, find_lakes
+from src.utils.rng import make_rng
+from src.utils.layer_raster import WATER
 
 class WaterGenerator:
-    def __init__(self, width, height):
+    def __init__(self, width, height, rng=None, layers=None):
         self.width = width
         self.height = height
+        self.rng = make_rng(rng)
+        # Optional shared LayerRaster that receives the WATER flag
+        self.layers = layers
+        # Hydrology rasters, kept for later stages once compute_flow has run
+        self.flow_direction = None
+        self.flow_accumulation = None
+        self.lake_labels = None
+        self.lake_volumes = None
+
+    def compute_flow(self, heightmap):
+        """D8 flow over the depression-filled terrain, so every cell drains off the map."""
+        self.flow_direction = drainage_direction(heightmap)
+        self.flow_accumulation = flow_accumulation(flow_receivers(self.flow_direction), heightmap.shape)
+        return self.flow_direction, self.flow_accumulation
+
+    def generate_rivers(self, heightmap, min_area=1000, river_width=1):
+        """Mark every cell draining at least ``min_area`` cells as river."""
+        self.compute_flow(heightmap)
+        river = self.flow_accumulation >= min_area
+        if river_width > 1:
+            river = binary_dilation(river, iterations=river_width // 2)
+        return river
 
     def generate_river(self, heightmap, start_point=None, meander=0.3, river_width=3):
         if start_point is None:
-            start_point = (np.random.randint(0, self.width), 0)
+            start_point = (int(self.rng.integers(0, self.width)), 0)
 
         river = np.zeros((self.height, self.width), dtype=bool)
         x, y = start_point
@@ -23,8 +48,8 @@ class WaterGenerator:
             next_x = min(possible_x, key=lambda px: heightmap[next_y, px])
             
             # Add meandering
-            if np.random.random() < meander:
-                next_x += np.random.choice([-1, 1])
+            if self.rng.random() < meander:
+                next_x += self.rng.choice([-1, 1])
                 next_x = max(0, min(self.width-1, next_x))
             
             x, y = next_x, next_y
@@ -42,11 +67,28 @@ class WaterGenerator:
         
         return lake
 
-    def apply_water_features(self, heightmap):
-        river = self.generate_river(heightmap)
-        lake = self.generate_lake(heightmap)
+    def generate_lakes(self, heightmap, min_volume=1.0):
+        """Flood the terrain's real depressions, keeping lakes of at least ``min_volume``."""
+        _, self.lake_labels, self.lake_volumes = find_lakes(heightmap, min_volume)
+        return self.lake_labels > 0
+
+    def apply_water_features(self, heightmap, river_mode="walk", lake_mode="lowest"):
+        if river_mode == "flow":
+            river = self.generate_rivers(heightmap)
+        elif river_mode == "walk":
+            river = self.generate_river(heightmap)
+        else:
+            raise ValueError(f"Unknown river mode: {river_mode}")
+        if lake_mode == "flood":
+            lake = self.generate_lakes(heightmap)
+        elif lake_mode == "lowest":
+            lake = self.generate_lake(heightmap)
+        else:
+            raise ValueError(f"Unknown lake mode: {lake_mode}")
         
         water_map = river | lake
+        if self.layers is not None:
+            self.layers.assign(WATER, water_map)
         
         # Lower the heightmap where there's water
         heightmap[water_map] = np.minimum(heightmap[water_map], np.min(heightmap) * 1.1)
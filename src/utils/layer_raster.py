@@ -0,0 +1,88 @@
+import numpy as np
+
+# Layer flags, one bit each in a LayerRaster cell
+WATER = 1
+ROAD = 2
+MAIN_ROAD = 4
+PARK = 8
+LANDMARK = 16
+
+LAYER_FLAGS = {'water': WATER, 'roads': ROAD, 'main_roads': MAIN_ROAD, 'parks': PARK, 'landmarks': LANDMARK}
+
+class LayerRaster:
+    """Boolean city layers stored as bit flags in a single uint8 raster.
+
+    ``where`` arguments accept anything NumPy can index with: slices, boolean
+    masks or index arrays. Flags can be OR-ed together, e.g. ``WATER | ROAD``.
+    """
+
+    def __init__(self, width, height, bits=None):
+        self.width = width
+        self.height = height
+        self.bits = np.zeros((height, width), dtype=np.uint8) if bits is None else bits
+        # Bumped on every write, so copies of the layers can tell when they are stale
+        self.version = 0
+
+    def set(self, flags, where=Ellipsis):
+        self.bits[where] |= np.uint8(flags)
+        self.version += 1
+
+    def clear(self, flags, where=Ellipsis):
+        self.bits[where] &= np.uint8(~flags & 0xFF)
+        self.version += 1
+
+    def assign(self, flags, mask):
+        """Set ``flags`` where ``mask`` is true and clear them everywhere else."""
+        self.clear(flags)
+        self.set(flags, mask)
+
+    def test(self, flags, where=Ellipsis):
+        """True where any of ``flags`` is set."""
+        return (self.bits[where] & np.uint8(flags)) != 0
+
+    def test_all(self, flags, where=Ellipsis):
+        """True where all of ``flags`` are set."""
+        return (self.bits[where] & np.uint8(flags)) == flags
+
+    def any(self, flags, where=Ellipsis):
+        return bool(np.any(self.bits[where] & np.uint8(flags)))
+
+    def count(self, flags, where=Ellipsis):
+        return int(np.count_nonzero(self.bits[where] & np.uint8(flags)))
+
+    def to_packed(self):
+        """One ``np.packbits`` plane per flag, in ``LAYER_FLAGS`` order."""
+        return np.stack([np.packbits(self.test(flag).ravel()) for flag in LAYER_FLAGS.values()])
+
+    @classmethod
+    def from_packed(cls, packed, width, height):
+        raster = cls(width, height)
+        for plane, flag in zip(packed, LAYER_FLAGS.values()):
+            mask = np.unpackbits(plane, count=width * height).reshape(height, width).view(bool)
+            raster.set(flag, mask)
+        return raster
+
+    def save(self, filename):
+        np.savez(filename, packed=self.to_packed(), shape=np.array([self.height, self.width]))
+
+    @classmethod
+    def load(cls, filename):
+        with np.load(filename) as data:
+            height, width = data['shape']
+            return cls.from_packed(data['packed'], int(width), int(height))
+
+if __name__ == "__main__":
+    import os
+    import tempfile
+
+    layers = LayerRaster(1024, 1024)
+    layers.set(WATER, np.random.rand(1024, 1024) < 0.1)
+    layers.set(ROAD, np.s_[500:510, :])
+    layers.set(ROAD | MAIN_ROAD, np.s_[:, 500:503])
+    print(f"Water cells: {layers.count(WATER)}, road cells: {layers.count(ROAD)}, main road cells: {layers.count(MAIN_ROAD)}")
+    print(f"Raster: {layers.bits.nbytes / 2**20:.1f} MiB vs {5 * layers.bits.size / 2**20:.1f} MiB as five bool arrays")
+
+    filename = os.path.join(tempfile.mkdtemp(), 'layers.npz')
+    layers.save(filename)
+    restored = LayerRaster.load(filename)
+    print(f"Packed on disk: {os.path.getsize(filename) / 2**20:.2f} MiB, round trip exact: {np.array_equal(layers.bits, restored.bits)}")
@@ -1,34 +1,83 @@
+from functools import lru_cache
+
 import numpy as np
 
+GRADIENTS = np.array([[0, 1], [0, -1], [1, 0], [-1, 0]], dtype=np.float64)
+
+
+@lru_cache(maxsize=64)
+def permutation_table(seed=0):
+    """Return the doubled 512-entry permutation table for a seed (cached, read-only)."""
+    p = np.arange(256, dtype=np.intp)
+    np.random.RandomState(seed).shuffle(p)
+    p = np.concatenate([p, p])
+    p.setflags(write=False)
+    return p
+
+
+@lru_cache(maxsize=64)
+def gradient_table(seed=0):
+    """Return the x and y gradient components for each permutation entry of a seed."""
+    h = permutation_table(seed) & 3
+    gx = GRADIENTS[h, 0]
+    gy = GRADIENTS[h, 1]
+    gx.setflags(write=False)
+    gy.setflags(write=False)
+    return gx, gy
+
 
 def perlin(x, y, seed=0):
-    """Generate a Perlin noise value for given coordinates."""
-    np.random.seed(seed)
-    p = np.arange(256, dtype=int)
-    np.random.shuffle(p)
-    p = np.stack([p, p]).flatten()
-    xi, yi = int(x), int(y)
-    xf, yf = x - xi, y - yi
+    """Generate Perlin noise for scalar or array coordinates (arrays are broadcast)."""
+    p = permutation_table(seed)
+    gx, gy = gradient_table(seed)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    x_floor = np.floor(x)
+    y_floor = np.floor(y)
+    xi = x_floor.astype(np.intp) & 255
+    yi = y_floor.astype(np.intp) & 255
+    xf = x - x_floor
+    yf = y - y_floor
     u = fade(xf)
     v = fade(yf)
-    n00 = gradient(p[p[xi] + yi], xf, yf)
-    n01 = gradient(p[p[xi] + yi + 1], xf, yf - 1)
-    n11 = gradient(p[p[xi + 1] + yi + 1], xf - 1, yf - 1)
-    n10 = gradient(p[p[xi + 1] + yi], xf - 1, yf)
+    xf1 = xf - 1
+    yf1 = yf - 1
+    # Hash corners once; gx/gy already fold the final permutation lookup in
+    a = p[xi] + yi
+    b = p[xi + 1] + yi
+    n00 = gx[a] * xf + gy[a] * yf
+    n01 = gx[a + 1] * xf + gy[a + 1] * yf1
+    n11 = gx[b + 1] * xf1 + gy[b + 1] * yf1
+    n10 = gx[b] * xf1 + gy[b] * yf
     x1 = lerp(n00, n10, u)
     x2 = lerp(n01, n11, u)
-    return lerp(x1, x2, v)
+    result = lerp(x1, x2, v)
+    return result if result.ndim else float(result)
+
+def summed_area_table(mask, dtype=np.int32):
+    """Integral image with a zero first row/column, shape (height + 1, width + 1)."""
+    height, width = mask.shape
+    table = np.zeros((height + 1, width + 1), dtype=dtype)
+    np.cumsum(mask, axis=0, dtype=dtype, out=table[1:, 1:])
+    np.cumsum(table[1:, 1:], axis=1, dtype=dtype, out=table[1:, 1:])
+    return table
+
+def window_sum(table, x0, y0, x1, y1):
+    """Sum over cells x0 <= x < x1, y0 <= y < y1 of a summed-area table, clipped to the map."""
+    height, width = table.shape[0] - 1, table.shape[1] - 1
+    x0, x1 = max(0, min(x0, width)), max(0, min(x1, width))
+    y0, y1 = max(0, min(y0, height)), max(0, min(y1, height))
+    return table[y1, x1] - table[y0, x1] - table[y1, x0] + table[y0, x0]
 
 def fade(t):
-    return 6 * t**5 - 15 * t**4 + 10 * t**3
+    return t * t * t * (t * (t * 6 - 15) + 10)
 
 def lerp(a, b, x):
     return a + x * (b - a)
 
 def gradient(h, x, y):
-    vectors = np.array([[0, 1], [0, -1], [1, 0], [-1, 0]])
-    g = vectors[h % 4]
-    return g[0] * x + g[1] * y
+    g = GRADIENTS[h & 3]
+    return g[..., 0] * x + g[..., 1] * y
 
 if __name__ == "__main__":
-    print(f"Perlin noise at (0.5, 0.5): {perlin(0.5, 0.5)}")
\ No newline at end of file
+    print(f"Perlin noise at (0.5, 0.5): {perlin(0.5, 0.5)}")
@@ -0,0 +1,157 @@
+import numpy as np
+from src.utils.rng import make_rng
+
+def density_radius(density, min_radius, max_radius):
+    """Per-cell radius raster: ``min_radius`` where ``density`` is 1, ``max_radius`` where it is 0."""
+    density = np.clip(density, 0.0, 1.0)
+    return (max_radius - density * (max_radius - min_radius)).astype(np.float32)
+
+def poisson_disk_sample(mask, radius, rng=None, rounds=10, shape=None):
+    """Random points inside ``mask`` with no two closer than ``radius``; returns an ``(n, 2)`` array of ``(x, y)``.
+
+    ``radius`` is a scalar or a per-cell raster (see ``density_radius``); with
+    a raster two points must be at least the larger of their radii apart.
+    ``mask`` may be None to sample the whole map, whose ``(height, width)``
+    then comes from the radius raster or ``shape``.
+
+    Like Bridson's algorithm, points live in a background grid of cells
+    ``min_radius / sqrt(2)`` wide, so each cell holds at most one point and a
+    candidate only needs checking against nearby cells. Instead of growing
+    from an active list one point at a time, every empty cell receives a dart
+    per round. Cells are processed in phases spaced far enough apart that
+    darts thrown in the same phase cannot conflict, so each phase is one
+    vectorized step. Cells wholly inside a placed disc are retired, and with a
+    radius raster a dart only tests the rings its own disc or a neighbour's
+    can reach.
+    """
+    rng = make_rng(rng)
+    radius_map = None if np.isscalar(radius) else np.asarray(radius, dtype=np.float32)
+    height, width = next(array.shape for array in (mask, radius_map) if array is not None) if shape is None else shape
+    min_radius = float(radius) if radius_map is None else float(radius_map.min())
+    max_radius = float(radius) if radius_map is None else float(radius_map.max())
+    if min_radius <= 0:
+        raise ValueError("radius must be positive")
+
+    cell = min_radius / np.sqrt(2)
+    grid_width, grid_height = int(np.ceil(width / cell)), int(np.ceil(height / cell))
+    reach = int(np.ceil(max_radius / cell))
+    # Same-phase cells are ``stride`` cells apart, i.e. at least max_radius between any two of their points
+    stride = reach + 1
+    # Point in each grid cell, flattened and padded by ``reach`` so neighbour lookups need no bounds checks
+    row = grid_width + 2 * reach
+    point_x = np.full((grid_height + 2 * reach) * row, np.nan)
+    point_y = np.full_like(point_x, np.nan)
+    point_r = np.zeros_like(point_x)
+    # Neighbour cells that can hold a conflicting point, nearest first so most darts are rejected early
+    dy, dx = np.mgrid[-reach:reach + 1, -reach:reach + 1].reshape(2, -1)
+    ring = np.maximum(abs(dy), abs(dx))
+    near = (ring > 0) & ((ring - 1) * cell < max_radius)
+    order = np.lexsort((np.hypot(dy, dx)[near], ring[near]))
+    dy, dx, ring = dy[near][order], dx[near][order], ring[near][order]
+    offsets = dy * row + dx
+
+    # Cells with no valid pixel at all are never tried
+    live = np.ones((grid_height, grid_width), dtype=bool)
+    if mask is not None:
+        live[:] = False
+        # Grid cell of every pixel row and column; each run of equal cells is reduced into that cell
+        row_cells = np.minimum((np.arange(height) / cell).astype(np.intp), grid_height - 1)
+        col_cells = np.minimum((np.arange(width) / cell).astype(np.intp), grid_width - 1)
+        row_cells, row_starts = np.unique(row_cells, return_index=True)
+        col_cells, col_starts = np.unique(col_cells, return_index=True)
+        covered = np.logical_or.reduceat(np.logical_or.reduceat(mask, row_starts, axis=0), col_starts, axis=1)
+        live[row_cells[:, np.newaxis], col_cells] = covered
+    # A conflicting neighbour lies within the dart's own radius or has a disc reaching the dart's cell;
+    # ``reached`` keeps the farthest ring any placed disc reaches into each cell
+    ring_gaps = (ring - 1) * cell
+    ring_ends = np.searchsorted(ring, np.arange(reach + 1), side='right')
+    reached = np.zeros(point_x.shape, dtype=np.intp)
+    phases = []
+    for phase_y in range(stride):
+        for phase_x in range(stride):
+            gy, gx = np.nonzero(live[phase_y::stride, phase_x::stride])
+            phases.append((gy * stride + phase_y + reach) * row + gx * stride + phase_x + reach)
+    # Cells lying wholly inside a placed point's disc, where no dart can land
+    dead = np.zeros_like(point_x, dtype=bool)
+    # Neighbours are tested in chunks doubling in size: small while most darts are alive, wide after
+    bounds = [0]
+    while bounds[-1] < offsets.size:
+        bounds.append(min(offsets.size, 2 * bounds[-1] + 8))
+
+    for _ in range(rounds):
+        for phase, cells in enumerate(phases):
+            cells = cells[~dead[cells]]
+            phases[phase] = cells
+            if cells.size == 0:
+                continue
+            gy, gx = np.divmod(cells, row)
+            x = (gx - reach + rng.random(cells.size)) * cell
+            y = (gy - reach + rng.random(cells.size)) * cell
+            ok = (x < width) & (y < height)
+            px, py = np.minimum(x, width - 1).astype(np.intp), np.minimum(y, height - 1).astype(np.intp)
+            if mask is not None:
+                ok &= mask[py, px]
+            r = radius_map[py, px].astype(np.float64) if radius_map is not None else np.full(cells.size, min_radius)
+            if radius_map is not None:
+                checked = np.maximum(np.searchsorted(ring_gaps, r), ring_ends[reached[cells]])
+            # Test the surviving darts against a few neighbour cells at a time
+            alive = np.flatnonzero(ok)
+            for start, stop in zip(bounds[:-1], bounds[1:]):
+                if radius_map is not None:
+                    alive = alive[checked[alive] > start]
+                if alive.size == 0:
+                    break
+                neighbours = cells[alive, np.newaxis] + offsets[start:stop]
+                limit = np.maximum(r[alive, np.newaxis], point_r[neighbours])
+                distance = (x[alive, np.newaxis] - point_x[neighbours]) ** 2 + (y[alive, np.newaxis] - point_y[neighbours]) ** 2
+                # NaN neighbours (empty cells) compare False and never block
+                conflict = (distance < limit ** 2).any(axis=1)
+                ok[alive[conflict]] = False
+                alive = alive[~conflict]
+            accepted = cells[ok]
+            x, y, r = x[ok], y[ok], r[ok]
+            point_x[accepted], point_y[accepted], point_r[accepted] = x, y, r
+            # Retire neighbour cells whose farthest corner lies inside the new point's disc
+            if accepted.size:
+                span = np.searchsorted(ring_gaps, r.max())
+                left = (accepted % row - reach)[:, np.newaxis] + dx[:span]
+                top = (accepted // row - reach)[:, np.newaxis] + dy[:span]
+                around = accepted[:, np.newaxis] + offsets[:span]
+                far_x = np.maximum(abs(x[:, np.newaxis] - left * cell), abs(x[:, np.newaxis] - (left + 1) * cell))
+                far_y = np.maximum(abs(y[:, np.newaxis] - top * cell), abs(y[:, np.newaxis] - (top + 1) * cell))
+                dead[around[far_x ** 2 + far_y ** 2 < (r ** 2)[:, np.newaxis]]] = True
+                if radius_map is not None:
+                    near_x = np.maximum(abs(x[:, np.newaxis] - (left + 0.5) * cell) - 0.5 * cell, 0)
+                    near_y = np.maximum(abs(y[:, np.newaxis] - (top + 0.5) * cell) - 0.5 * cell, 0)
+                    touched = near_x ** 2 + near_y ** 2 < (r ** 2)[:, np.newaxis]
+                    np.maximum.at(reached, around[touched], np.broadcast_to(ring[:span], touched.shape)[touched])
+            dead[accepted] = True
+
+    filled = ~np.isnan(point_x)
+    return np.column_stack([point_x[filled], point_y[filled]])
+
+if __name__ == "__main__":
+    import time
+    from scipy.spatial import cKDTree
+
+    size = 4096
+    mask = np.random.default_rng(0).random((size, size)) < 0.9
+    start = time.perf_counter()
+    points = poisson_disk_sample(mask, 20.0, rng=0)
+    elapsed = time.perf_counter() - start
+    nearest, _ = cKDTree(points).query(points, k=2)
+    print(f"{size}x{size}, radius 20: {len(points)} points in {elapsed:.3f}s, closest pair {nearest[:, 1].min():.2f}")
+
+    # A band much thinner than the radius, like the near-road spots landmarks are drawn from
+    band = np.zeros((1000, 1000), dtype=bool)
+    band[15:17] = True
+    points = poisson_disk_sample(band, 20.0, rng=0)
+    assert len(points) > 0 and band[points[:, 1].astype(int), points[:, 0].astype(int)].all()
+    print(f"1000x1000, two-row band: {len(points)} points")
+
+    size = 2048
+    y, x = np.ogrid[:size, :size]
+    density = np.exp(-((x - size / 2) ** 2 + (y - size / 2) ** 2) / (2 * (size / 4) ** 2))
+    start = time.perf_counter()
+    points = poisson_disk_sample(None, density_radius(density, 10.0, 40.0), rng=0)
+    print(f"{size}x{size}, radius 10-40 by density: {len(points)} points in {time.perf_counter() - start:.3f}s")
@@ -1,7 +1,43 @@
 import matplotlib.pyplot as plt
 import numpy as np
+from src.utils.layer_raster import WATER, ROAD, MAIN_ROAD, PARK, LANDMARK
+from src.city import zone_types
+
+# City map value for every combination of layer bits: main road > road > water
+_FLAGS = np.arange(256)
+GROUND_LUT = np.select([_FLAGS & MAIN_ROAD != 0, _FLAGS & ROAD != 0, _FLAGS & WATER != 0], [3, 2, 1], 0).astype(np.uint8)
 
 class CityVisualizer:
+    @staticmethod
+    def compose_city_map(city_data, park_value=7, landmark_value=8):
+        """Combine water, roads, buildings, parks and landmarks into one categorical map."""
+        buildings = city_data['buildings']
+        layers = city_data.get('layers')
+        if layers is not None:
+            # One table lookup per pass over the bit-packed layers
+            city_map = GROUND_LUT[layers]
+            np.add(buildings, 3, out=city_map, where=buildings > 0, casting='unsafe')
+            overlay = np.select([_FLAGS & LANDMARK != 0, _FLAGS & PARK != 0], [landmark_value, park_value], 0).astype(np.uint8)
+            features = overlay[layers]
+            return np.where(features > 0, features, city_map)
+
+        city_map = np.zeros_like(city_data['zoning'])
+        city_map[city_data['water_map']] = 1
+        city_map[city_data['roads']] = 2
+        city_map[city_data['main_roads']] = 3
+        city_map[buildings > 0] = buildings[buildings > 0] + 3
+        city_map[city_data['parks']] = park_value
+        city_map[city_data['landmarks']] = landmark_value
+        return city_map
+
+    @staticmethod
+    def overlay_congestion(ax, city_data):
+        """Draw the traffic volume/capacity ratio over road cells, if the city has one."""
+        if 'congestion' not in city_data:
+            return
+        congestion = np.asarray(city_data['congestion'])
+        ax.imshow(np.ma.masked_where(congestion <= 0, congestion), cmap='RdYlGn_r', vmin=0, vmax=1.5)
+
     @staticmethod
     def visualize_city(city_data):
         fig, axs = plt.subplots(2, 2, figsize=(15, 15))
@@ -13,35 +49,24 @@ class CityVisualizer:
         axs[0, 0].set_title('Terrain with Water')
         
         # Visualize zoning with parks and landmarks
-        zoning_cmap = plt.cm.colors.ListedColormap(['blue', 'green', 'yellowgreen', 'yellow', 'red', 'purple', 'orange', 'darkgreen', 'gold'])
-        zoning_with_features = city_data['zoning'].copy()
-        zoning_with_features[city_data['parks']] = 7
-        zoning_with_features[city_data['landmarks']] = 8
-        axs[0, 1].imshow(zoning_with_features, cmap=zoning_cmap)
+        zoning_cmap = plt.cm.colors.ListedColormap(zone_types.ZONE_COLORS)
+        zoning_with_features = np.array(city_data['zoning'])
+        zoning_with_features[city_data['parks']] = zone_types.PARK
+        zoning_with_features[city_data['landmarks']] = zone_types.LANDMARK
+        axs[0, 1].imshow(zoning_with_features, cmap=zoning_cmap, vmin=0, vmax=zone_types.ZONE_COUNT - 1)
         axs[0, 1].set_title('Sophisticated Zoning with Parks and Landmarks')
         
         # Visualize roads, buildings, water, parks, and landmarks
-        city_map = np.zeros_like(city_data['zoning'])
-        city_map[city_data['water_map']] = 1
-        city_map[city_data['roads']] = 2
-        city_map[city_data['main_roads']] = 3
-        city_map[city_data['buildings'] > 0] = city_data['buildings'][city_data['buildings'] > 0] + 3
-        city_map[city_data['parks']] = 8
-        city_map[city_data['landmarks']] = 9
+        city_map = CityVisualizer.compose_city_map(city_data, park_value=8, landmark_value=9)
         city_cmap = plt.cm.colors.ListedColormap(['white', 'blue', 'gray', 'black', 'lightgreen', 'green', 'darkgreen', 'red', 'darkgreen', 'gold'])
         axs[1, 0].imshow(city_map, cmap=city_cmap)
         axs[1, 0].set_title('City Map with Sophisticated Zoning')
         
         # Visualize roads, buildings, water, parks, and landmarks
-        city_map = np.zeros_like(city_data['zoning'])
-        city_map[city_data['water_map']] = 1
-        city_map[city_data['roads']] = 2
-        city_map[city_data['main_roads']] = 3
-        city_map[city_data['buildings'] > 0] = city_data['buildings'][city_data['buildings'] > 0] + 3
-        city_map[city_data['parks']] = 7
-        city_map[city_data['landmarks']] = 8
+        city_map = CityVisualizer.compose_city_map(city_data)
         city_cmap = plt.cm.colors.ListedColormap(['white', 'blue', 'gray', 'black', 'green', 'red', 'purple', 'darkgreen', 'yellow'])
         axs[1, 0].imshow(city_map, cmap=city_cmap)
+        CityVisualizer.overlay_congestion(axs[1, 0], city_data)
         axs[1, 0].set_title('City Map with Water, Parks, and Landmarks')
         
         # Visualize 3D terrain with roads, water, parks, and landmarks
@@ -77,16 +102,11 @@ class CityVisualizer:
     def save_city_image(city_data, filename):
         plt.figure(figsize=(10, 10))
         
-        city_map = np.zeros_like(city_data['zoning'])
-        city_map[city_data['water_map']] = 1
-        city_map[city_data['roads']] = 2
-        city_map[city_data['main_roads']] = 3
-        city_map[city_data['buildings'] > 0] = city_data['buildings'][city_data['buildings'] > 0] + 3
-        city_map[city_data['parks']] = 7
-        city_map[city_data['landmarks']] = 8
+        city_map = CityVisualizer.compose_city_map(city_data)
         
         city_cmap = plt.cm.colors.ListedColormap(['#C0C0C0', '#4169E1', '#808080', '#000000', '#90EE90', '#FF4500', '#800080', '#228B22', '#FFD700'])
         plt.imshow(city_map, cmap=city_cmap)
+        CityVisualizer.overlay_congestion(plt.gca(), city_data)
         plt.axis('off')
         plt.title('Generated City with Parks and Landmarks')
         plt.savefig(filename, dpi=300, bbox_inches='tight')
@@ -97,6 +117,7 @@ if __name__ == "__main__":
     
     generator = CityGenerator(256, 256)
     generator.generate_city()
+    generator.simulate_traffic()
     city_data = generator.get_city_data()
     
     CityVisualizer.visualize_city(city_data)